@@ -0,0 +1,233 @@
+import collections
+import math
+import threading
+import time
+
+MAX_TRACKED_BUCKETS = 10000  # Idle (full) buckets are dropped past this many
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, retry_after, reason):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds, for the Retry-After header
+        self.reason = reason  # 'rate_limited', 'user_limit', 'queue_full' or 'queue_timeout'
+
+
+class AdmissionClass:
+    def __init__(self, rate, burst, concurrency, max_queue, max_queue_per_user=2, max_in_flight_per_user=None, queue_timeout=20):
+        self.rate = rate  # Requests per second each user earns
+        self.burst = burst  # Bucket size: how many requests a user can make back to back
+        self.concurrency = concurrency  # Requests of this class served at once, across all users
+        self.max_queue = max_queue  # Waiting requests beyond that before we answer 429
+        self.max_queue_per_user = max_queue_per_user
+        self.max_in_flight_per_user = max_in_flight_per_user  # One user's requests of this class holding a thread, served or queued
+        self.queue_timeout = queue_timeout  # Give up waiting for a slot after this many seconds
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        # Returns 0 if a token was taken, otherwise the seconds until one is available
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def idle(self):
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.burst
+
+
+class _Waiter:
+    def __init__(self, user):
+        self.user = user
+        self.granted = threading.Event()
+        self.enqueued = time.monotonic()
+
+
+class _Ticket:
+    def __init__(self, controller, name, user):
+        self._controller = controller
+        self._name = name
+        self._user = user
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self._name, self._user, time.monotonic() - self._started)
+
+
+class AdmissionController:
+    """Per-user rate limits and fair queueing for expensive endpoint classes.
+
+    Every user gets a token bucket per class, so one user's burst can't use
+    up everyone's share. Each class also has a fixed number of slots. When
+    they're taken, requests wait in per-user queues that are served round
+    robin, so a user with ten queued requests doesn't push others back ten
+    places. Full queues and exhausted buckets are answered straight away
+    with a Retry-After hint rather than left to time out. Limits are per
+    process, so with several gunicorn workers they apply per worker.
+
+    A queued request still holds a worker thread, so the queue only works
+    if it fits in the thread pool. capacity caps the threads all classes
+    together may hold, served or queued, and max_per_user does the same for
+    one user, so a single client can't occupy every thread. Past either
+    limit the request is turned away rather than left in the server's
+    backlog, where nothing is fair.
+    """
+
+    def __init__(self, classes, metrics=None, capacity=None, max_per_user=None):
+        self.classes = dict(classes)  # name -> AdmissionClass
+        self.metrics = metrics
+        self.capacity = capacity
+        self.max_per_user = max_per_user
+        self._lock = threading.Lock()
+        self._buckets = {}  # (class, user) -> TokenBucket
+        self._held = collections.Counter()  # (class, user) -> requests served or queued
+        self._held_by_user = collections.Counter()  # user -> the same, across classes
+        self._in_flight = collections.Counter()
+        self._queues = {name: {} for name in self.classes}  # class -> {user: deque of waiters}
+        self._turns = {name: collections.deque() for name in self.classes}  # class -> users in round-robin order
+        self._service_time = {name: 1.0 for name in self.classes}  # EWMA of seconds per request
+        self._stats = {name: collections.Counter() for name in self.classes}
+
+    def acquire(self, name, user):
+        spec = self.classes[name]
+        with self._lock:
+            bucket = self._bucket(name, user)
+            wait = bucket.take()
+            if wait:
+                self._reject(name, 'rate_limited')
+                raise AdmissionRejected('Too many requests, slow down', wait, 'rate_limited')
+
+            if self._over_user_limit(spec, name, user):
+                self._reject(name, 'user_limit')
+                raise AdmissionRejected('Too many requests in progress, wait for one to finish', self._estimated_wait(name, 0), 'user_limit')
+
+            queued = self._queued(name)
+            at_capacity = self.capacity is not None and sum(self._held_by_user.values()) >= self.capacity
+            if self._in_flight[name] < spec.concurrency and not queued and not at_capacity:
+                self._in_flight[name] += 1
+                self._hold(name, user, 1)
+                self._stats[name]['admitted'] += 1
+                return _Ticket(self, name, user)
+
+            user_queue = self._queues[name].get(user, ())
+            if at_capacity or queued >= spec.max_queue or len(user_queue) >= spec.max_queue_per_user:
+                self._reject(name, 'queue_full')
+                raise AdmissionRejected('Server busy, try again shortly', self._estimated_wait(name, queued), 'queue_full')
+
+            self._hold(name, user, 1)
+            waiter = _Waiter(user)
+            if user not in self._queues[name]:
+                self._queues[name][user] = collections.deque()
+                self._turns[name].append(user)
+            self._queues[name][user].append(waiter)
+            self._stats[name]['max_queued'] = max(self._stats[name]['max_queued'], queued + 1)
+
+        if not waiter.granted.wait(spec.queue_timeout):
+            with self._lock:
+                if not waiter.granted.is_set():
+                    self._dequeue(name, waiter)
+                    self._hold(name, user, -1)
+                    self._reject(name, 'queue_timeout')
+                    raise AdmissionRejected('Server busy, try again shortly', self._estimated_wait(name, self._queued(name)), 'queue_timeout')
+        waited = time.monotonic() - waiter.enqueued
+        with self._lock:
+            self._stats[name]['admitted'] += 1
+            self._stats[name]['queued_admissions'] += 1
+            self._stats[name]['wait_ms_total'] += waited * 1000
+        if self.metrics:
+            self.metrics.observe('admission_queue_wait_seconds', waited, endpoint_class=name)
+        return _Ticket(self, name, user)
+
+    def stats(self):
+        with self._lock:
+            snapshot = {}
+            for name, spec in self.classes.items():
+                stats = dict(self._stats[name])
+                queued_admissions = stats.pop('queued_admissions', 0)
+                wait_ms_total = stats.pop('wait_ms_total', 0)
+                snapshot[name] = {
+                    'concurrency': spec.concurrency,
+                    'max_queue': spec.max_queue,
+                    'in_flight': self._in_flight[name],
+                    'queued': self._queued(name),
+                    'queued_users': len(self._turns[name]),
+                    'max_queued': stats.pop('max_queued', 0),
+                    'admitted': stats.pop('admitted', 0),
+                    'avg_queue_wait_ms': round(wait_ms_total / queued_admissions, 2) if queued_admissions else 0.0,
+                    'avg_service_ms': round(self._service_time[name] * 1000, 2),
+                    'rejected': {reason: stats.get(reason, 0) for reason in ('rate_limited', 'user_limit', 'queue_full', 'queue_timeout')}
+                }
+        return snapshot
+
+    def _release(self, name, user, service_time):
+        with self._lock:
+            self._hold(name, user, -1)
+            self._service_time[name] = 0.8 * self._service_time[name] + 0.2 * service_time
+            turns = self._turns[name]
+            if not turns:
+                self._in_flight[name] -= 1
+                return
+            # Hand the slot straight to the next user in round-robin order
+            user = turns.popleft()
+            user_queue = self._queues[name][user]
+            waiter = user_queue.popleft()
+            if user_queue:
+                turns.append(user)
+            else:
+                del self._queues[name][user]
+            waiter.granted.set()
+
+    def _over_user_limit(self, spec, name, user):
+        if spec.max_in_flight_per_user is not None and self._held[(name, user)] >= spec.max_in_flight_per_user:
+            return True
+        return self.max_per_user is not None and self._held_by_user[user] >= self.max_per_user
+
+    def _hold(self, name, user, delta):
+        self._held[(name, user)] += delta
+        self._held_by_user[user] += delta
+        if not self._held[(name, user)]:
+            del self._held[(name, user)]
+        if not self._held_by_user[user]:
+            del self._held_by_user[user]
+
+    def _dequeue(self, name, waiter):
+        user_queue = self._queues[name].get(waiter.user)
+        if user_queue and waiter in user_queue:
+            user_queue.remove(waiter)
+            if not user_queue:
+                del self._queues[name][waiter.user]
+                self._turns[name].remove(waiter.user)
+
+    def _queued(self, name):
+        return sum(len(user_queue) for user_queue in self._queues[name].values())
+
+    def _estimated_wait(self, name, queued):
+        spec = self.classes[name]
+        return max(1, math.ceil(self._service_time[name] * (queued + 1) / spec.concurrency))
+
+    def _bucket(self, name, user):
+        key = (name, user)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_BUCKETS:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.idle()}
+            spec = self.classes[name]
+            bucket = self._buckets[key] = TokenBucket(spec.rate, spec.burst)
+        return bucket
+
+    def _reject(self, name, reason):
+        self._stats[name][reason] += 1
+        if self.metrics:
+            self.metrics.inc('admission_rejections_total', endpoint_class=name, reason=reason)
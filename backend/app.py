@@ -1,54 +1,305 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context, url_for
 from datetime import timedelta
 import os
-import requests
+import httpx
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 import base64
 import json
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from bson import ObjectId
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import datetime
+import re
+import time
+import click
+import functools
+import hashlib
+import itertools
+import math
+from concurrent.futures import ThreadPoolExecutor
+from barcode_cache import BarcodeCache
+from catalog import ProductCatalog, iter_product_dump
+from item_info_cache import ItemInfoCache, normalize_item_name
+from inventory_changes import ChangeLogGap, InventoryChangeLog
+from item_names import ItemNameCanonicalizer, ordered_item_name_key, tokenize_item_name
+from ttl_cache import TTLCache
+from upstream import UpstreamGateway
+from model_router import ModelRoute, ModelRouter
+from admission import AdmissionClass, AdmissionController, AdmissionRejected
+from metrics import Metrics, MongoCommandMetrics
+from recipe_cache import RecipeSuggestionCache, inventory_fingerprint
+from chat_context import CHAT_WINDOW_TOKENS, ConversationStore, estimate_tokens, recent_window
+from json_provider import FastJSONProvider, dumps as json_dumps, iter_json_array, parse_json_completion
+from images import IMAGE_VARIANTS, ImageStore, InvalidImage, decode_data_url, prepare_vision_image
+from inventory import (
+    DEFAULT_PAGE_SIZE, INVENTORY_SORTS, MAX_PAGE_SIZE, InvalidQuery,
+    build_projection, ensure_inventory_indexes, format_expiry_date, insert_items, list_expiring,
+    list_inventory_page, parse_expiry_date, parse_within, search_inventory
+)
 
 load_dotenv()
 app = Flask(__name__)
+# Behind nginx (see setup.sh), so absolute URLs such as image links take the scheme and client address
+# from X-Forwarded-*; set TRUSTED_PROXY_HOPS=0 when serving directly
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
 CORS(app)
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(days=7)  # Extend token validity to 7 days
-
-# Custom JSON encoder to handle ObjectId
-class JSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, ObjectId):
-            return str(o)
-        return super().default(o)
-
-app.json_encoder = JSONEncoder
+app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # Largest upload we accept (a 10MB image as a data URL)
+
+# orjson-backed JSON (with a stdlib fallback) that understands ObjectId and datetimes
+app.json_provider_class = FastJSONProvider
+app.json = FastJSONProvider(app)
+
+# Latency, error and token counters for routes and every outbound call, served at /metrics
+metrics = Metrics()
+metrics.describe('http_request_duration_seconds', 'histogram', 'Time to build the response, by route')
+metrics.describe('http_request_errors_total', 'counter', 'Responses with a 5xx status, by route')
+metrics.describe('mongo_command_duration_seconds', 'histogram', 'Mongo command latency, by command')
+metrics.describe('mongo_command_errors_total', 'counter', 'Failed Mongo commands, by command')
+metrics.describe('upstream_request_duration_seconds', 'histogram', 'Outbound call latency (excluding queueing), by upstream or LLM model')
+metrics.describe('upstream_errors_total', 'counter', 'Failed outbound calls, by upstream or LLM model')
+metrics.describe('llm_tokens_total', 'counter', 'LLM tokens reported in response.usage, by model')
+metrics.describe('llm_router_events_total', 'counter', 'Hedged requests, fallbacks and failures, by LLM task')
+metrics.describe('admission_rejections_total', 'counter', 'Requests answered 429, by endpoint class and reason')
+metrics.describe('admission_queue_wait_seconds', 'histogram', 'Time queued for a slot, by endpoint class')
+metrics.describe('admission_in_flight', 'gauge', 'Requests being served, by endpoint class')
+metrics.describe('admission_queued', 'gauge', 'Requests waiting for a slot, by endpoint class')
+metrics.describe('bcrypt_duration_seconds', 'histogram', 'Password hashing and checking time')
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # If set, /metrics requires "Authorization: Bearer <token>"
+TIMING_HEADER = os.getenv("TIMING_HEADER", "0") == "1"  # Always send Server-Timing, not only when asked
 
 # MongoDB setup
-client = MongoClient(os.getenv("MONGO_URI"))  # Add your MongoDB Atlas URI
+client = MongoClient(os.getenv("MONGO_URI"), event_listeners=[MongoCommandMetrics(metrics)])  # Add your MongoDB Atlas URI
 db = client.grocify
 items_collection = db.items
 users_collection = db.users
+barcode_cache_collection = db.barcode_cache
+products_collection = db.products
+item_info_cache_collection = db.item_info_cache
+item_names_collection = db.item_names
+image_store = ImageStore(db)
+# Per-user inventory version (the inventory ETag) and the log of what each version changed
+inventory_changes = InventoryChangeLog(db.inventory_versions, db.inventory_changes)
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
-gpt_client = OpenAI(base_url="https://api.groq.com/openai/v1", api_key=os.getenv("GROK_API_KEY"))
+gpt_client = AsyncOpenAI(base_url=os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1"), api_key=os.getenv("GROK_API_KEY"), timeout=60, max_retries=1)
 
 # BarcodeLookup API credentials
 BARCODE_LOOKUP_API_KEY = os.getenv("BARCODE_API_KEY")
-BARCODE_LOOKUP_API_URL = "https://api.barcodelookup.com/v3/products"
+BARCODE_LOOKUP_API_URL = os.getenv("BARCODE_LOOKUP_API_URL", "https://api.barcodelookup.com/v3/products")
+BARCODE_LOOKUP_TIMEOUT = httpx.Timeout(10, connect=3.05)
+MAX_BARCODE_BATCH = 50
+
+# Caps how many BarcodeLookup calls a batch request can have in flight at once
+barcode_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='barcode')
+
+# All outbound calls go through one gateway: per-upstream concurrency limits, coalescing of
+# identical in-flight requests, and a bounded keep-alive pool for plain HTTP upstreams
+upstream = UpstreamGateway(
+    gpt_client,
+    httpx.AsyncClient(
+        timeout=BARCODE_LOOKUP_TIMEOUT,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    ),
+    limits={
+        'barcodelookup': 16,
+        'mixtral-8x7b-32768': 8,
+        'gemma2-9b-it': 8,
+        'llama-3.2-90b-vision-preview': 4,  # Vision calls are the slowest and largest
+        'llama-3.2-11b-vision-preview': 4
+    },
+    default_limit=8,
+    timeout=90,
+    metrics=metrics
+)
+
+# Candidate models per LLM task, preferred first. A call still running after `budget` seconds is
+# hedged with the next candidate; a failed call falls back to it. LLM_ROUTES (JSON, e.g.
+# {"chat": {"models": ["gemma2-9b-it"], "budget": 3}}) overrides the defaults per task.
+LLM_ROUTES = {
+    'item_info': ModelRoute(['mixtral-8x7b-32768', 'llama-3.1-8b-instant', 'gemma2-9b-it'], budget=2, timeout=30),
+    'item_info_batch': ModelRoute(['mixtral-8x7b-32768', 'llama-3.3-70b-versatile', 'gemma2-9b-it'], budget=6, timeout=60),
+    'extract_info': ModelRoute(['llama-3.2-90b-vision-preview', 'llama-3.2-11b-vision-preview'], budget=6, timeout=60),
+    'recipe': ModelRoute(['mixtral-8x7b-32768', 'llama-3.3-70b-versatile', 'gemma2-9b-it'], budget=8, timeout=90),
+    'custom_recipe': ModelRoute(['gemma2-9b-it', 'llama-3.3-70b-versatile', 'mixtral-8x7b-32768'], budget=8, timeout=90),
+    'chat': ModelRoute(['gemma2-9b-it', 'llama-3.1-8b-instant'], budget=3, timeout=45),
+    'chat_summary': ModelRoute(['gemma2-9b-it', 'llama-3.1-8b-instant'], budget=4, timeout=45)
+}
+LLM_ROUTES.update({task: ModelRoute(**route) for task, route in json.loads(os.getenv("LLM_ROUTES", "{}")).items()})
+llm = ModelRouter(upstream, LLM_ROUTES)
+
+# Threads per gunicorn worker (setup.sh runs --threads 8). Admission limits are per process, so they're sized
+# from this: LLM and BarcodeLookup calls may hold all but RESERVED_THREADS of them, served or queued, and the
+# rest are left for the cheap endpoints (login, inventory) so those never wait behind a slow model
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "8"))
+RESERVED_THREADS = 2
+ADMISSION_THREADS = max(1, WORKER_THREADS - RESERVED_THREADS)
+
+def admission_slots(share):
+    return max(1, round(ADMISSION_THREADS * share))
+
+# Per-user token buckets (rate per second, burst), shared slots with a fair queue and a cap on each user's
+# requests in progress, for the endpoints that tie up a worker thread on the LLM or BarcodeLookup
+admission = AdmissionController({
+    'vision': AdmissionClass(rate=10 / 60, burst=5, concurrency=admission_slots(1 / 3), max_queue=admission_slots(1 / 3), max_queue_per_user=1, max_in_flight_per_user=1, queue_timeout=20),
+    'recipe': AdmissionClass(rate=6 / 60, burst=3, concurrency=admission_slots(1 / 3), max_queue=admission_slots(1 / 3), max_queue_per_user=1, max_in_flight_per_user=1, queue_timeout=30),
+    'chat': AdmissionClass(rate=30 / 60, burst=10, concurrency=admission_slots(1 / 2), max_queue=admission_slots(1 / 3), max_queue_per_user=1, max_in_flight_per_user=2, queue_timeout=20),
+    'item_info': AdmissionClass(rate=60 / 60, burst=20, concurrency=admission_slots(1 / 2), max_queue=admission_slots(1 / 3), max_queue_per_user=1, max_in_flight_per_user=2, queue_timeout=20),
+    'barcode': AdmissionClass(rate=120 / 60, burst=30, concurrency=admission_slots(1 / 2), max_queue=admission_slots(1 / 2), max_queue_per_user=2, max_in_flight_per_user=2, queue_timeout=10)
+}, metrics=metrics, capacity=ADMISSION_THREADS, max_per_user=admission_slots(1 / 2))
+
+# Background recipe precomputation after inventory changes runs on its own threads, not the worker's, so it
+# gets its own (much smaller) budget and never takes a slot from a request
+warmup_admission = AdmissionController({
+    'recipe_warmup': AdmissionClass(rate=6 / 3600, burst=4, concurrency=2, max_queue=8, max_queue_per_user=4, queue_timeout=60)
+}, metrics=metrics)
+
+# Goes under @jwt_required(). The slot is held until the response is closed, so streamed answers count too
+def admission_controlled(endpoint_class):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                ticket = admission.acquire(endpoint_class, get_jwt_identity())
+            except AdmissionRejected as e:
+                response = jsonify({'error': str(e), 'reason': e.reason})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+                return response
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except Exception:
+                ticket.release()
+                raise
+            response.call_on_close(ticket.release)
+            return response
+        return wrapper
+    return decorator
+
+class BarcodeLookupError(Exception):
+    pass
+
+# Pull the fields we care about out of a BarcodeLookup response (None if no product matched)
+def parse_barcode_product(data):
+    if 'products' in data and len(data['products']) > 0:
+        product = data['products'][0]  # Get the first product match
+        product_name = product.get('title', 'Unknown Product')
+        product_image = product['images'][0] if 'images' in product and len(product['images']) > 0 else None
+        return {'name': product_name, 'image': product_image}
+    return None
+
+# Make the API call to BarcodeLookup.com
+def fetch_barcode_product(barcode):
+    params = {
+        'barcode': barcode,
+        'key': BARCODE_LOOKUP_API_KEY
+    }
+    response = upstream.get(BARCODE_LOOKUP_API_URL, params=params, limit='barcodelookup')
+
+    # BarcodeLookup answers an unknown barcode with 404; that's a "not found" worth caching, not an error
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise BarcodeLookupError(f'API request failed with status code {response.status_code}')
+    return parse_barcode_product(response.json())
+
+# Local product catalog, seeded with flask --app app import-products <dump>
+product_catalog = ProductCatalog(products_collection)
+
+# Catalog first; only misses go to BarcodeLookup, and what it finds is kept in the catalog
+def resolve_barcode_product(barcode):
+    product = product_catalog.get(barcode)
+    if product is not None:
+        return product
+    product = fetch_barcode_product(barcode)
+    if product is not None:
+        product_catalog.put(barcode, product, source='barcodelookup')
+    return product
+
+barcode_cache = BarcodeCache(
+    resolve_barcode_product,
+    collection=barcode_cache_collection,
+    maxsize=4096,
+    ttl=7 * 24 * 3600,  # Product titles and images rarely change
+    negative_ttl=24 * 3600,  # Retry unknown barcodes daily in case they get listed
+    recheck=product_catalog.get  # ...but pick up catalog imports straight away
+)
+
+# Canonical product keys for item names, used by stored items, search and the item-info cache
+item_names = ItemNameCanonicalizer(item_names_collection)
+
+# The exact name as written, minus sizes and filler words: a fuzzy match here would hand one product's
+# shelf life to another ("green peas" vs "green tea")
+def item_name_cache_key(item_name):
+    return ordered_item_name_key(item_name) or normalize_item_name(item_name)
+
+# Memoized get-item-info answers; set ITEM_INFO_CACHE_MONGO=0 to keep them in-process only
+item_info_cache = ItemInfoCache(
+    collection=item_info_cache_collection if os.getenv("ITEM_INFO_CACHE_MONGO", "1") == "1" else None,
+    maxsize=2048,
+    ttl=30 * 24 * 3600,
+    normalize=item_name_cache_key
+)
+
+# Vision answers keyed by perceptual hash, so re-sending the same photo skips the model
+EXTRACT_INFO_CACHE_TTL = 24 * 3600
+extract_info_cache = TTLCache(maxsize=512)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.begin_request()
 
 # For CORS
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Request-Timing')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE')
+    if response.status_code == 429:
+        response.headers.add('Access-Control-Expose-Headers', 'Retry-After')
+    if 'X-Conversation-Id' in response.headers:
+        response.headers.add('Access-Control-Expose-Headers', 'X-Conversation-Id')
+    if 'X-Inventory-Version' in response.headers:
+        response.headers.add('Access-Control-Expose-Headers', 'ETag,X-Inventory-Version')
+    return record_request_metrics(response)
+
+# Streamed responses are timed up to the first byte; the LLM time shows up under upstream_* instead
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    spans = metrics.end_request()
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe('http_request_duration_seconds', elapsed, route=route, method=request.method, status=response.status_code)
+    if response.status_code >= 500:
+        metrics.inc('http_request_errors_total', route=route, method=request.method)
+
+    if TIMING_HEADER or request.headers.get('X-Request-Timing') == '1':
+        timings = [f'app;dur={elapsed * 1000:.1f}'] + [f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(spans.items())]
+        response.headers['Server-Timing'] = ', '.join(timings)
+        response.headers.add('Access-Control-Expose-Headers', 'Server-Timing')
     return response
 
+# Prometheus scrape endpoint
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Unauthorized'}), 401
+    for endpoint_class, stats in {**admission.stats(), **warmup_admission.stats()}.items():
+        metrics.set('admission_in_flight', stats['in_flight'], endpoint_class=endpoint_class)
+        metrics.set('admission_queued', stats['queued'], endpoint_class=endpoint_class)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # User registration
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -63,7 +314,8 @@ def register():
     if users_collection.find_one({'username': username}):
         return jsonify({'error': 'Username already exists'}), 400
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    with metrics.timer('bcrypt_duration_seconds', span='bcrypt', operation='hash'):
+        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
     user = {
         'username': username,
         'password': hashed_password,
@@ -84,7 +336,11 @@ def login():
         return jsonify({'error': 'Missing username or password'}), 400
 
     user = users_collection.find_one({'username': username})
-    if user and bcrypt.check_password_hash(user['password'], password):
+    password_ok = False
+    if user:
+        with metrics.timer('bcrypt_duration_seconds', span='bcrypt', operation='check'):
+            password_ok = bcrypt.check_password_hash(user['password'], password)
+    if password_ok:
         access_token = create_access_token(identity=username)
         refresh_token = create_refresh_token(identity=username)
         return jsonify({'access_token': access_token, 'refresh_token': refresh_token}), 200
@@ -144,43 +400,93 @@ def user_info():
 # Route to handle barcode lookup
 @app.route('/api/barcode/<barcode>', methods=['GET'])
 @jwt_required()
+@admission_controlled('barcode')
 def lookup_barcode(barcode):
     try:
-        # Make the API call to BarcodeLookup.com
-        params = {
-            'barcode': barcode,
-            'key': BARCODE_LOOKUP_API_KEY
-        }
-        response = requests.get(BARCODE_LOOKUP_API_URL, params=params)
-        
-        # Check if the response status is OK (200)
-        if response.status_code != 200:
-            return jsonify({'error': f'API request failed with status code {response.status_code}'}), 500
-        
-        # Parse the response as JSON
-        data = response.json()
-
-        # Check if data was found
-        if 'products' in data and len(data['products']) > 0:
-            product = data['products'][0]  # Get the first product match
-            product_name = product.get('title', 'Unknown Product')
-            product_image = product['images'][0] if 'images' in product and len(product['images']) > 0 else None
-
-            return jsonify({
-                'name': product_name,
-                'image': product_image
-            })
-        else:
+        product = barcode_cache.lookup(barcode)
+        if product is None:
             return jsonify({'error': 'Product not found'}), 404
+        return jsonify(product)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Route to add the item with expiry date
-@app.route('/api/add-item', methods=['POST'])
+# Route to resolve a batch of barcodes in one request
+@app.route('/api/barcodes', methods=['POST'])
 @jwt_required()
-def add_item():
-    data = request.json
+@admission_controlled('barcode')
+def lookup_barcodes():
+    try:
+        data = request.json
+        barcodes = data.get('barcodes')
+
+        if not barcodes or not isinstance(barcodes, list):
+            return jsonify({'error': 'No barcodes provided'}), 400
+
+        # Drop duplicates but keep the order they were scanned in
+        barcodes = list(dict.fromkeys(str(barcode) for barcode in barcodes))
+        if len(barcodes) > MAX_BARCODE_BATCH:
+            return jsonify({'error': f'Too many barcodes (max {MAX_BARCODE_BATCH})'}), 400
+
+        products, errors = barcode_cache.lookup_many(barcodes, barcode_executor)
+        results = []
+        for barcode in barcodes:
+            if barcode in errors:
+                results.append({'barcode': barcode, 'error': str(errors[barcode])})
+            elif products.get(barcode) is None:
+                results.append({'barcode': barcode, 'error': 'Product not found'})
+            else:
+                results.append({'barcode': barcode, **products[barcode]})
+
+        return jsonify({'results': results}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Route to report upstream queue depth and wait times
+@app.route('/api/upstream/stats', methods=['GET'])
+@jwt_required()
+def upstream_stats():
+    return jsonify(upstream.stats()), 200
+
+# Route to report per-model latency and hedge/fallback counts for the LLM router
+@app.route('/api/llm-router/stats', methods=['GET'])
+@jwt_required()
+def llm_router_stats():
+    return jsonify(llm.stats()), 200
+
+# Route to report admission queue lengths and 429 counts per endpoint class
+@app.route('/api/admission/stats', methods=['GET'])
+@jwt_required()
+def admission_stats():
+    return jsonify({**admission.stats(), **warmup_admission.stats()}), 200
+
+# Route to report barcode cache hit/miss counters
+@app.route('/api/barcode-cache/stats', methods=['GET'])
+@jwt_required()
+def barcode_cache_stats():
+    return jsonify({**barcode_cache.stats(), 'catalog': product_catalog.stats()}), 200
+
+# Move inline data-URL images into the image store; remote URLs (e.g. from BarcodeLookup) stay as they are
+def externalize_image(item):
+    image = item.get('image')
+    if isinstance(image, str) and image.startswith('data:'):
+        item['image_hash'] = image_store.put_data_url(image)
+        del item['image']
+    return item
+
+MAX_BULK_ITEMS = 100
+
+class InvalidItem(ValueError):
+    pass
+
+class InvalidRecipe(ValueError):
+    pass
+
+# Validate an add-item payload and build the document to insert
+def build_item(username, data):
+    if not isinstance(data, dict):
+        raise InvalidItem('Missing data')
     barcode = data.get('barcode')
     name = data.get('name')
     image = data.get('image')
@@ -188,23 +494,98 @@ def add_item():
 
     # Ensure all required data is present
     if not all([name, image, expiry_date]):
-        return jsonify({'error': 'Missing data'}), 400
+        raise InvalidItem('Missing data')
 
-    # Insert the item into MongoDB
+    # Stored as a real date so expiry queries can use the index
+    expiry_date = parse_expiry_date(expiry_date)
+    if expiry_date is None:
+        raise InvalidItem('Invalid expiry date')
+
+    name_key, name_tokens = item_names.canonicalize(name)
     item = {
-        'username': get_jwt_identity(),
+        'username': username,
         'barcode': barcode,
         'item_name': name,
+        'name_key': name_key,
+        'name_tokens': name_tokens,
         'image': image,
         'expiry_date': expiry_date
     }
-    items_collection.insert_one(item)
+    # Optional client-generated key; a unique index turns retries into no-ops
+    idempotency_key = data.get('idempotency_key')
+    if idempotency_key:
+        item['idempotency_key'] = str(idempotency_key)
+    return externalize_image(item)
+
+# Route to add the item with expiry date
+@app.route('/api/add-item', methods=['POST'])
+@jwt_required()
+def add_item():
+    data = request.json
+    try:
+        item = build_item(get_jwt_identity(), data)
+    except (InvalidItem, InvalidImage) as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Insert the item into MongoDB
+    try:
+        items_collection.insert_one(item)
+    except DuplicateKeyError:
+        return jsonify({'message': 'Item already added'}), 200
+    inventory_changes.record(item['username'], inserted_ids=[item['_id']])
+    recipe_suggestions.invalidate(item['username'])
 
     return jsonify({'message': 'Item added successfully'}), 201
 
+# Route to add many items in one request (e.g. after a big shop)
+@app.route('/api/items/bulk', methods=['POST'])
+@jwt_required()
+def add_items_bulk():
+    try:
+        data = request.json
+        entries = data.get('items')
+        if not entries or not isinstance(entries, list):
+            return jsonify({'error': 'No items provided'}), 400
+        if len(entries) > MAX_BULK_ITEMS:
+            return jsonify({'error': f'Too many items (max {MAX_BULK_ITEMS})'}), 400
+
+        # A request-level Idempotency-Key gives every entry a stable key, so retrying the whole request is safe
+        request_key = request.headers.get('Idempotency-Key')
+        current_user = get_jwt_identity()
+        results = [None] * len(entries)
+        documents, positions = [], []
+        for index, entry in enumerate(entries):
+            if request_key and isinstance(entry, dict) and not entry.get('idempotency_key'):
+                entry = {**entry, 'idempotency_key': f'{request_key}:{index}'}
+            try:
+                documents.append(build_item(current_user, entry))
+                positions.append(index)
+            except (InvalidItem, InvalidImage) as e:
+                results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+
+        for index, (status, detail) in zip(positions, insert_items(items_collection, current_user, documents)):
+            if status == 'error':
+                results[index] = {'index': index, 'status': status, 'error': detail}
+            else:
+                results[index] = {'index': index, 'status': status, '_id': str(detail) if detail else None}
+
+        created_ids = [ObjectId(result['_id']) for result in results if result['status'] == 'created']
+        created = len(created_ids)
+        if created:
+            inventory_changes.record(current_user, inserted_ids=created_ids)
+            recipe_suggestions.invalidate(current_user)
+        return jsonify({
+            'created': created,
+            'results': results
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Route to fetch LLM-based item info (expiry date and dietary compatibility)
 @app.route('/api/get-item-info', methods=['POST'])
 @jwt_required()
+@admission_controlled('item_info')
 def get_item_info():
     try:
         data = request.json
@@ -213,13 +594,22 @@ def get_item_info():
             return jsonify({'error': 'No item name provided'}), 400
 
         dietary_restrictions = users_collection.find_one({'username': get_jwt_identity()}).get('dietary_restrictions')
+
+        # Same item + same restrictions always gets the same answer, so skip the LLM when we can
+        if not data.get('bypass_cache'):
+            cached_info = item_info_cache.get(item_name, dietary_restrictions)
+            if cached_info:
+                response = jsonify(cached_info)
+                response.headers['X-Cache'] = 'HIT'
+                return response, 200
+
         # Use GPT to evaluate dietary compatibility and estimate expiry
-        response = gpt_client.chat.completions.create(
-            model="mixtral-8x7b-32768",
+        response = llm.chat(
+            'item_info',
             messages=[
                 {
                     "role": "system",
-                    "content": "Provide a JSON response indicating whether a given item meets specified dietary restrictions and an estimated expiry date for the item.\n\n# Steps\n\n1. **Understand the Input Parameters:**\n   - `item_name`: The name of the item to be evaluated.\n   - `current_date`: The date on which the assessment is made.\n   - `dietary_restrictions`: A list of dietary restrictions that the item must comply with.\n\n2. **Assess Dietary Compatibility:**\n   - Identify whether the `item_name` complies with the provided `dietary_restrictions`.\n   - Determine compatibility as \"yes\" if all restrictions are met, otherwise \"no.\"\n\n3. **Estimate Expiry Date:**\n   - Provide an estimated expiry date for the `item_name`, taking into account typical shelf life and storage conditions.\n\n4. **Prepare JSON Response:**\n   - Include the key `dietary_compatible` with a value of \"yes\" or \"no.\"\n   - Include `estimated_expiry_date` with the calculated date."
+                    "content": "Provide a JSON response indicating whether a given item meets specified dietary restrictions and an estimated expiry date for the item.\n\n# Steps\n\n1. **Understand the Input Parameters:**\n   - `item_name`: The name of the item to be evaluated.\n   - `current_date`: The date on which the assessment is made.\n   - `dietary_restrictions`: A list of dietary restrictions that the item must comply with.\n\n2. **Assess Dietary Compatibility:**\n   - Identify whether the `item_name` complies with the provided `dietary_restrictions`.\n   - Determine compatibility as \"yes\" if all restrictions are met, otherwise \"no.\"\n\n3. **Estimate Expiry Date:**\n   - Provide an estimated expiry date for the `item_name`, taking into account typical shelf life and storage conditions.\n\n4. **Prepare JSON Response:**\n   - Include the key `dietary_compatible` with a value of \"yes\" or \"no.\"\n   - Include `estimated_expiry_date` with the calculated date (YYYY-MM-DD).\n   - Include `shelf_life_days` with the number of days from `current_date` to `estimated_expiry_date` as an integer."
                 },
                 {
                     "role": "user",
@@ -240,36 +630,162 @@ def get_item_info():
 
         if response and response.choices:
             item_info = response.choices[0].message.content.strip()
-            item_info_json = json.loads(item_info)
-            return jsonify(item_info_json), 200
+            item_info_json = parse_json_completion(item_info)
+            # Falls back to the raw answer if it's missing fields we can cache on
+            item_info_json = item_info_cache.put(item_name, dietary_restrictions, item_info_json) or item_info_json
+            response = jsonify(item_info_json)
+            response.headers['X-Cache'] = 'MISS'
+            return response, 200
         else:
             return jsonify({'error': 'Failed to retrieve item information from GPT'}), 500
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+MAX_ITEM_INFO_BATCH = 40
+ITEM_INFO_BATCH_INPUT_TOKENS = 3000  # Budget for the item list in one completion
+ITEM_INFO_TOKENS_PER_ITEM = 60  # Rough output size of one verdict
+ITEM_INFO_BATCH_MAX_TOKENS = 2048
+
+# Split item names into chunks that fit both the input and output token budgets
+def pack_item_info_batches(item_names):
+    batches = [[]]
+    input_tokens = 0
+    for item_name in item_names:
+        tokens = estimate_tokens(json.dumps(item_name)) + 8  # id and JSON framing
+        batch = batches[-1]
+        if batch and (input_tokens + tokens > ITEM_INFO_BATCH_INPUT_TOKENS
+                      or (len(batch) + 1) * ITEM_INFO_TOKENS_PER_ITEM > ITEM_INFO_BATCH_MAX_TOKENS):
+            batches.append([])
+            input_tokens = 0
+        batches[-1].append(item_name)
+        input_tokens += tokens
+    return [batch for batch in batches if batch]
+
+# Ask the LLM for verdicts on several items in a single completion; returns {item_name: info}
+def fetch_item_info_batch(item_names, dietary_restrictions):
+    response = llm.chat(
+        'item_info_batch',
+        messages=[
+            {
+                "role": "system",
+                "content": "Provide a JSON response indicating, for each item in a list, whether it meets specified dietary restrictions and an estimated expiry date.\n\n# Steps\n\n1. **Understand the Input Parameters:**\n   - `items`: A list of objects, each with an `id` and the `item_name` to be evaluated.\n   - `current_date`: The date on which the assessment is made.\n   - `dietary_restrictions`: A list of dietary restrictions that every item must comply with.\n\n2. **Assess Dietary Compatibility:**\n   - For each item, identify whether it complies with the provided `dietary_restrictions`.\n   - Determine compatibility as \"yes\" if all restrictions are met, otherwise \"no.\"\n\n3. **Estimate Expiry Date:**\n   - For each item, provide an estimated expiry date, taking into account typical shelf life and storage conditions.\n\n4. **Prepare JSON Response:**\n   - Return an object with the key `items`, an array with one entry per input item.\n   - Each entry includes `id` (copied from the input), `dietary_compatible` with a value of \"yes\" or \"no\", `estimated_expiry_date` with the calculated date (YYYY-MM-DD) and `shelf_life_days` with the number of days from `current_date` to `estimated_expiry_date` as an integer."
+            },
+            {
+                "role": "user",
+                "content": json.dumps({
+                    "items": [{"id": i, "item_name": item_name} for i, item_name in enumerate(item_names)],
+                    "current_date": str(datetime.date.today()),
+                    "dietary_restrictions": dietary_restrictions
+                })
+            }
+        ],
+        temperature=0.5,
+        max_tokens=min(ITEM_INFO_BATCH_MAX_TOKENS, ITEM_INFO_TOKENS_PER_ITEM * len(item_names) + 50),
+        top_p=1,
+        frequency_penalty=0,
+        presence_penalty=0,
+        response_format={"type": "json_object"}
+    )
+
+    if not response or not response.choices:
+        raise ValueError('Failed to retrieve item information from GPT')
+    answers = parse_json_completion(response.choices[0].message.content.strip()).get('items', [])
+    results = {}
+    for answer in answers:
+        try:
+            item_name = item_names[int(answer.get('id'))]
+        except (TypeError, ValueError, IndexError):
+            continue
+        results[item_name] = answer
+    return results
+
+# Route to fetch item info for several items at once
+@app.route('/api/get-item-info/batch', methods=['POST'])
+@jwt_required()
+@admission_controlled('item_info')
+def get_item_info_batch():
+    try:
+        data = request.json
+        item_names = data.get('item_names')
+        if not item_names or not isinstance(item_names, list):
+            return jsonify({'error': 'No item names provided'}), 400
+
+        item_names = list(dict.fromkeys(str(item_name) for item_name in item_names if item_name))
+        if len(item_names) > MAX_ITEM_INFO_BATCH:
+            return jsonify({'error': f'Too many items (max {MAX_ITEM_INFO_BATCH})'}), 400
+
+        dietary_restrictions = users_collection.find_one({'username': get_jwt_identity()}).get('dietary_restrictions')
+
+        verdicts = {}
+        if not data.get('bypass_cache'):
+            for item_name in item_names:
+                cached_info = item_info_cache.get(item_name, dietary_restrictions)
+                if cached_info:
+                    verdicts[item_name] = cached_info
+
+        errors = {}
+        uncached = [item_name for item_name in item_names if item_name not in verdicts]
+        for batch in pack_item_info_batches(uncached):
+            try:
+                answers = fetch_item_info_batch(batch, dietary_restrictions)
+            except Exception as e:
+                errors.update({item_name: str(e) for item_name in batch})
+                continue
+            for item_name in batch:
+                if item_name not in answers:
+                    errors[item_name] = 'No answer for this item'
+                    continue
+                verdicts[item_name] = item_info_cache.put(item_name, dietary_restrictions, answers[item_name]) or answers[item_name]
+                verdicts[item_name].pop('id', None)
+
+        results = []
+        for item_name in item_names:
+            if item_name in verdicts:
+                results.append({'item_name': item_name, **verdicts[item_name]})
+            else:
+                results.append({'item_name': item_name, 'error': errors.get(item_name, 'No answer for this item')})
+        return jsonify({'results': results}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Route to report get-item-info cache hit/miss counters
+@app.route('/api/item-info-cache/stats', methods=['GET'])
+@jwt_required()
+def item_info_cache_stats():
+    return jsonify(item_info_cache.stats()), 200
+
 # Route to extract item information from an image
 @app.route('/api/extract-info', methods=['POST'])
 @jwt_required()
+@admission_controlled('vision')
 def extract_info():
     try:
-        data = request.json
-        image_data = data.get('image')
+        # Accept a multipart upload, a raw image/* body, or the original JSON data URL
+        if 'image' in request.files:
+            image_bytes = request.files['image'].read()
+        elif request.mimetype.startswith('image/'):
+            image_bytes = request.get_data()
+        else:
+            image_data = (request.get_json(silent=True) or {}).get('image')
+            image_bytes = decode_data_url(image_data)[1] if image_data else None
 
-        if not image_data:
+        if not image_bytes:
             return jsonify({'error': 'No image provided'}), 400
 
-        img_type = image_data.split(';')[0].split(':')[1]
-
-        # Decode the image data
-        image_bytes = base64.b64decode(image_data.split(',')[1])
-
-        # Convert image bytes to base64 string
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        # The vision model doesn't need a full-resolution camera frame
+        image_phash, vision_image = prepare_vision_image(image_bytes)
+        found, item_info_json = extract_info_cache.get(image_phash)
+        if found:
+            response = jsonify(item_info_json)
+            response.headers['X-Cache'] = 'HIT'
+            return response, 201
+        image_base64 = base64.b64encode(vision_image).decode('utf-8')
 
         # Use GPT to extract information
-        response = gpt_client.chat.completions.create(
-            model="llama-3.2-90b-vision-preview",
+        response = llm.chat(
+            'extract_info',
             messages=[
                 {
                    "role": "user",
@@ -281,7 +797,7 @@ def extract_info():
                         {"type": "text", "text": "Image"},
                         {
                             "type": "image_url",
-                            "image_url": {"url": f"data:{img_type};base64,{image_base64}"},
+                            "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
                         },
                     ],
                 }
@@ -293,36 +809,206 @@ def extract_info():
             presence_penalty=0,
             response_format={"type": "json_object"},
         )
-        print(response)
         if response and response.choices:
             item_info = response.choices[0].message.content.strip()
-            item_info_json = json.loads(item_info)
+            item_info_json = parse_json_completion(item_info)
         else:
             return jsonify({'error': 'No valid response from GPT'}), 500
 
-        return jsonify(item_info_json), 201
+        extract_info_cache.set(image_phash, item_info_json, EXTRACT_INFO_CACHE_TTL)
+        response = jsonify(item_info_json)
+        response.headers['X-Cache'] = 'MISS'
+        return response, 201
 
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def serialize_item(item):
+    item = dict(item)
+    item['_id'] = str(item['_id'])
+    if 'expiry_date' in item:
+        item['expiry_date'] = format_expiry_date(item['expiry_date'])
+    # Stored images go out as a thumbnail URL rather than inline bytes
+    image_hash = item.pop('image_hash', None)
+    if image_hash:
+        item['image'] = url_for('get_image', image_hash=image_hash, size='thumb', _external=True)
+    return item
+
+# Route to serve stored images. Not behind JWT so plain <img> tags can load them;
+# the URL is a SHA-256 of the content, so it can't be enumerated.
+@app.route('/api/images/<image_hash>', methods=['GET'])
+def get_image(image_hash):
+    size = request.args.get('size', 'full')
+    if not re.fullmatch(r'[0-9a-f]{64}', image_hash) or size not in IMAGE_VARIANTS:
+        return jsonify({'error': 'Image not found'}), 404
+
+    # Content never changes for a given hash, so the ETag can be checked without touching GridFS
+    etag = f'{image_hash}-{size}'
+    cache_control = 'public, max-age=31536000, immutable'
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
+
+    image = image_store.get(image_hash, size)
+    if image is None:
+        return jsonify({'error': 'Image not found'}), 404
+    data, content_type = image
+    response = Response(data, content_type=content_type)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+# Weak ETag for an inventory listing: the user's inventory version plus the query that shaped the response
+def inventory_etag(username, version):
+    digest = hashlib.sha256(f'{username}\0{version}\0'.encode('utf-8') + request.query_string).hexdigest()[:16]
+    return f'{version}-{digest}'
+
+def inventory_not_modified(etag, version):
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return with_inventory_version(Response(status=304), etag, version)
+
+def with_inventory_version(response, etag, version):
+    # no-cache rather than no-store: clients keep the copy but revalidate it on every use
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['X-Inventory-Version'] = str(version)
+    return response
+
+# Unpaged inventories up to this size are read in full before answering, so a Mongo error is still a clean 500
+INVENTORY_STREAM_THRESHOLD = 500
+
 # Route to fetch inventory items
 @app.route('/api/inventory', methods=['GET'])
 @jwt_required()
 def get_inventory():
     try:
         current_user = get_jwt_identity()  # Get the username from the token
-        items = items_collection.find({"username": current_user})
-        inventory_list = []
-        for item in items:
-            inventory_list.append({
-                "_id": str(item["_id"]),
-                "item_name": item["item_name"],
-                "expiry_date": item["expiry_date"],
-                "image": item["image"]
-            })
-        return jsonify(inventory_list), 200
+        sort = request.args.get('sort', '_id')
+        fields = request.args.get('fields')
+
+        # Read the version before the items: a write in between leaves the ETag stale, never the data
+        version = inventory_changes.version(current_user)
+        etag = inventory_etag(current_user, version)
+        not_modified = inventory_not_modified(etag, version)
+        if not_modified:
+            return not_modified
+
+        # Without paging parameters, keep returning the whole inventory as a plain list
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            if sort not in INVENTORY_SORTS:
+                return jsonify({'error': f'Unsupported sort: {sort}'}), 400
+            items = items_collection.find({"username": current_user}, build_projection(fields)).sort(INVENTORY_SORTS[sort])
+            first = list(itertools.islice(items, INVENTORY_STREAM_THRESHOLD + 1))
+            if len(first) <= INVENTORY_STREAM_THRESHOLD:
+                return with_inventory_version(jsonify([serialize_item(item) for item in first]), etag, version), 200
+            # Larger ones are streamed as they're read from the cursor, so they're never built up in memory;
+            # an error past this point can only cut the body short
+            rest = itertools.chain(first, items)
+            response = Response(stream_with_context(iter_json_array(serialize_item(item) for item in rest)), mimetype='application/json')
+            return with_inventory_version(response, etag, version), 200
+
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        items, next_cursor = list_inventory_page(
+            items_collection, current_user,
+            sort=sort, cursor=request.args.get('cursor'), limit=limit, fields=fields
+        )
+        response = jsonify({
+            'items': [serialize_item(item) for item in items],
+            'next_cursor': next_cursor
+        })
+        return with_inventory_version(response, etag, version), 200
+
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Route to fetch what changed in the inventory since a version the client already has.
+# 410 means the log no longer reaches back that far and the client should refetch /api/inventory.
+@app.route('/api/inventory/changes', methods=['GET'])
+@jwt_required()
+def get_inventory_changes():
+    try:
+        current_user = get_jwt_identity()
+        since = request.args.get('since', type=int)
+        if since is None or since < 0:
+            return jsonify({'error': 'Missing or invalid since version'}), 400
+
+        try:
+            version, inserted_ids, deleted_ids = inventory_changes.changes_since(current_user, since)
+        except ChangeLogGap:
+            return jsonify({'error': 'Changes are no longer available, refetch the inventory', 'version': inventory_changes.version(current_user)}), 410
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        etag = inventory_etag(current_user, version)
+        not_modified = inventory_not_modified(etag, version)
+        if not_modified:
+            return not_modified
+
+        inserted = []
+        if inserted_ids:
+            inserted = items_collection.find(
+                {'_id': {'$in': inserted_ids}, 'username': current_user},
+                build_projection(request.args.get('fields'))
+            ).sort('_id', 1)
+        response = jsonify({
+            'version': version,
+            'inserted': [serialize_item(item) for item in inserted],
+            'deleted': [str(item_id) for item_id in deleted_ids]
+        })
+        return with_inventory_version(response, etag, version), 200
+
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
+# Route to fetch items expiring within a window, soonest first
+@app.route('/api/inventory/expiring', methods=['GET'])
+@jwt_required()
+def get_expiring_items():
+    try:
+        within = parse_within(request.args.get('within', '3d'))
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        include_expired = request.args.get('include_expired', 'true').lower() != 'false'
+        items = list_expiring(
+            items_collection, get_jwt_identity(), within,
+            limit=limit, fields=request.args.get('fields'), include_expired=include_expired
+        )
+        return jsonify([serialize_item(item) for item in items]), 200
+
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Route to search the inventory by name; matches word prefixes and tolerates small typos
+@app.route('/api/inventory/search', methods=['GET'])
+@jwt_required()
+def search_inventory_items():
+    try:
+        query = request.args.get('q', '')
+        tokens = tokenize_item_name(query)
+        if not tokens:
+            return jsonify({'error': 'Missing search query'}), 400
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        items = search_inventory(
+            items_collection, get_jwt_identity(), item_names.correct_tokens(tokens),
+            limit=limit, fields=request.args.get('fields')
+        )
+        return jsonify([serialize_item(item) for item in items]), 200
+
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -339,34 +1025,99 @@ def delete_item(item_id):
         result = items_collection.delete_one({'_id': item_id, 'username': current_user})
         
         if result.deleted_count == 1:
+            inventory_changes.record(current_user, deleted_ids=[item_id])
+            recipe_suggestions.invalidate(current_user)
             return jsonify({'message': 'Item deleted successfully'}), 200
         else:
             return jsonify({'error': 'Item not found or unauthorized access'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Live Chat with Recipe Assistant
-@app.route('/api/chat-recipe', methods=['POST'])
-@jwt_required()
-def chat_recipe():
-    try:
-        # Get user identity and input data
-        current_user = get_jwt_identity()
-        data = request.json
-        messages = data.get('messages')
-        recipe_name = data.get('recipe_name')
-        description = data.get('description')
-        ingredients = data.get('ingredients')
-        steps = data.get('steps')
+MAX_RECIPE_INGREDIENTS = 100
+
+# None (or 0) means every ingredient; anything but a non-negative whole number is a client error
+def recipe_ingredient_limit(data):
+    max_ingredients = data.get('max_ingredients')
+    if max_ingredients is None or max_ingredients == '':
+        return None
+    if isinstance(max_ingredients, bool) or not re.fullmatch(r'\s*\d+\s*', str(max_ingredients)):
+        raise InvalidQuery('max_ingredients must be a non-negative integer')
+    return min(int(max_ingredients), MAX_RECIPE_INGREDIENTS) or None
+
+# Ingredients for the recipe prompts. With max_ingredients=K only the K items closest to expiry
+# are sent; if the client sends no list, those K are read straight from the expiry index.
+def select_recipe_ingredients(data):
+    max_ingredients = recipe_ingredient_limit(data)
+    ingredients = data.get('ingredients')
+
+    if not ingredients and max_ingredients:
+        return load_recipe_ingredients(get_jwt_identity(), max_ingredients)
+
+    ingredients = [{"item_name": item["item_name"], "expiry_date": item["expiry_date"]} for item in ingredients or []]
+    if max_ingredients:
+        # Unreadable dates sort last
+        ingredients.sort(key=lambda item: parse_expiry_date(item["expiry_date"]) or datetime.datetime.max)
+        ingredients = ingredients[:max_ingredients]
+    return ingredients
+
+# Clients opt into server-sent events with {"stream": true} or an Accept: text/event-stream header
+def wants_stream(data):
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json_dumps(data)}\n\n"
+
+# Stream a completion as SSE: a "token" event per delta, then one final event with
+# the whole answer (validated JSON for final_event='recipe'), then "done"
+def stream_completion(task, completion_args, final_event, on_complete=None, parse=None, fallback=None, done=None):
+    # parse(content, finish_reason) turns the text into the final payload; if it raises, fallback() is used instead.
+    # done is the payload of the closing "done" event
+    completion_args = dict(completion_args)
+    # JSON mode can't be combined with streaming, so the JSON is validated at the end instead
+    completion_args.pop('response_format', None)
+
+    def generate():
+        chunks, finish_reason = [], None
+        try:
+            for chunk in llm.stream_chat(task, **completion_args):
+                if not chunk.choices:
+                    continue
+                finish_reason = getattr(chunk.choices[0], 'finish_reason', None) or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield sse_event('token', {'content': delta})
+
+            content = ''.join(chunks).strip()
+            result = content
+            if parse:
+                try:
+                    result = parse(content, finish_reason)
+                except ValueError:
+                    # The streamed answer is unusable; the final event carries the fallback's answer instead
+                    result = fallback()
+            if on_complete:
+                on_complete(result)
+            yield sse_event(final_event, result)
+            yield sse_event('done', done or {})
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+
+    return sse_response(generate())
+
+def sse_response(events):
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
 
-        if not messages:
-            return jsonify({'error': 'No messages provided'}), 400
+# A cached recipe over SSE: just the final event, no tokens
+def stream_cached(recipe):
+    response = sse_response(iter([sse_event('recipe', recipe), sse_event('done', {})]))
+    response.headers['X-Cache'] = 'HIT'
+    return response
 
-        # Include recipe context in each request to maintain context
-        recipe_context = [
-            {
-                "role": "system",
-                "content": """Answer any user's follow-up questions about the process of cooking a given recipe using the provided details.
+CHAT_RECIPE_PROMPT = """Answer any user's follow-up questions about the process of cooking a given recipe using the provided details.
 
 You have access to:
 - Recipe name
@@ -416,14 +1167,84 @@ Steps: ["Preheat the oven to 375°F (190°C).", "Roast the chicken for about 1 h
 - Ensure answers are based on the recipe details provided.
 - Handle edge cases, such as missing temperature or cooking times, by advising a standard reference or suggesting checking the recipe again.
 - Keep responses polite and informative.
-- Avoid off-topic questions or topics.\n""" + f"Recipe Name: {recipe_name}\nDescription: {description}\nIngredients: {ingredients}\nSteps: {steps}"
+- Avoid off-topic questions or topics.\n"""
+CHAT_SUMMARY_MAX_TOKENS = 200
+
+# The recipe (and any summary of earlier turns) rides along in the system prompt
+def chat_system_message(recipe, summary=''):
+    content = CHAT_RECIPE_PROMPT + f"Recipe Name: {recipe.get('recipe_name')}\nDescription: {recipe.get('description')}\nIngredients: {recipe.get('ingredients')}\nSteps: {recipe.get('steps')}"
+    if summary:
+        content += f"\n\nSummary of the conversation so far:\n{summary}"
+    return {"role": "system", "content": content}
+
+# Fold turns that dropped out of the chat window into the rolling summary
+def summarize_chat(previous_summary, turns):
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    response = llm.chat(
+        'chat_summary',
+        messages=[
+            {
+                "role": "system",
+                "content": "Update the running summary of a conversation between a user and a cooking assistant about one recipe. Keep what matters for later questions: the user's preferences, substitutions or changes agreed on, problems they ran into, and which step they are on. Reply with the updated summary only, in a few short sentences."
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
             }
-        ]
-        messages_with_context = recipe_context + messages
+        ],
+        temperature=0.3,
+        max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+        top_p=1,
+        frequency_penalty=0,
+        presence_penalty=0
+    )
+    return response.choices[0].message.content.strip()
+
+conversations = ConversationStore(db.conversations, summarize_chat)
+
+# Live Chat with Recipe Assistant. Clients either send {conversation_id, message} (plus the
+# recipe on the first turn) and the history stays on the server, or the older stateless
+# {messages, recipe...} form, which is trimmed to the same token window.
+@app.route('/api/chat-recipe', methods=['POST'])
+@jwt_required()
+@admission_controlled('chat')
+def chat_recipe():
+    try:
+        # Get user identity and input data
+        current_user = get_jwt_identity()
+        data = request.json
+        message = data.get('message')
+        messages = data.get('messages')
+        recipe = {
+            'recipe_name': data.get('recipe_name'),
+            'description': data.get('description'),
+            'ingredients': data.get('ingredients'),
+            'steps': data.get('steps')
+        }
+
+        if not message and not messages:
+            return jsonify({'error': 'No messages provided'}), 400
+
+        conversation = None
+        if message:
+            conversation_id = data.get('conversation_id')
+            if conversation_id:
+                conversation = conversations.load(conversation_id, current_user)
+                if not conversation:
+                    return jsonify({'error': 'Conversation not found'}), 404
+            else:
+                conversation = conversations.start(current_user, recipe)
+            messages_with_context = (
+                [chat_system_message(conversation['recipe'], conversation['summary'])]
+                + conversation['turns']
+                + [{'role': 'user', 'content': message}]
+            )
+        else:
+            # Include recipe context in each request to maintain context
+            messages_with_context = [chat_system_message(recipe)] + recent_window(messages, CHAT_WINDOW_TOKENS)
 
         # Use OpenAI to get a response for the chat with the provided system prompt
-        response = gpt_client.chat.completions.create(
-            model="gemma2-9b-it",
+        completion_args = dict(
             messages=messages_with_context,
             temperature=1,
             max_tokens=150,
@@ -431,10 +1252,23 @@ Steps: ["Preheat the oven to 375°F (190°C).", "Roast the chicken for about 1 h
             frequency_penalty=0,
             presence_penalty=0
         )
+        on_complete = (lambda answer: conversations.record(conversation, message, answer)) if conversation else None
+        if wants_stream(data):
+            # The id also goes in the "done" event, for clients that can't read response headers
+            done = {'conversation_id': conversation['_id']} if conversation else None
+            response = stream_completion('chat', completion_args, final_event='message', on_complete=on_complete, done=done)
+            if conversation:
+                response.headers['X-Conversation-Id'] = conversation['_id']
+            return response
+
+        response = llm.chat('chat', **completion_args)
 
         if response and response.choices:
             assistant_message = response.choices[0].message.content.strip()
-            return jsonify(assistant_message), 200
+            if not conversation:
+                return jsonify(assistant_message), 200
+            on_complete(assistant_message)
+            return jsonify({'conversation_id': conversation['_id'], 'message': assistant_message}), 200
         else:
             return jsonify({'error': 'Failed to generate response from assistant'}), 500
 
@@ -442,99 +1276,258 @@ Steps: ["Preheat the oven to 375°F (190°C).", "Roast the chicken for about 1 h
         return jsonify({'error': str(e)}), 500
 
  
+def custom_recipe_completion_args(ingredients, dietary_restrictions=None, cuisine='', special_requests=''):
+    # Update prompt to include dietary restrictions, cuisine, and special requests
+    system_content = "Take an input in JSON format containing a list of ingredients (item_name, expiry_date). Generate a recipe using these ingredients.\n\nTo create the recipe:\n- Minimize the use of unavailable ingredients.\n- Prioritize ingredients nearing expiry.\n- Ensure recipes are specific.\n- Include missing ingredients (those required but not available) with quantities.\n\nConsider user preferences:\n" + f"- Dietary Restrictions: {', '.join(dietary_restrictions) if dietary_restrictions else 'None'}\n" + f"- Preferred Cuisine: {cuisine}\n" + f"- Special Requests: {special_requests}\n" + "# Output Format\n\nThe output should be a JSON object:\n- recipe_name: Name of the recipe.\n- description: Brief description.\n- ingredients: Array of objects (item_name, quantity, unit).\n- steps: Array of preparation steps.\n- missing_ingredients: Array of missing ingredients (item_name, quantity, unit)."
+
+    return dict(
+        messages=[
+            {
+                "role": "system",
+                "content": system_content
+            },
+            {
+                "role": "user",
+                "content": json.dumps(ingredients)
+            }
+        ],
+        temperature=1,
+        max_tokens=2048,
+        top_p=1,
+        frequency_penalty=0,
+        presence_penalty=0,
+        response_format={"type": "json_object"}
+    )
+
+def recipe_completion_args(ingredients):
+    return dict(
+        messages=[
+            {
+                "role": "system",
+                "content": "Take an input in a JSON format containing a list of ingredients with properties: item_name and expiry_date. Generate a recipe that can be made with these ingredients.\n\nTo create a recipe:\n- Minimize the use of ingredients not already available.\n- Prioritize using ingredients with upcoming expiry dates.\n- Ensure recipes are specific and not vague.\n\n# Steps\n\n1. Analyze the list of available ingredients, focusing on those nearing expiry.\n2. Identify potential recipes that can be made with the given ingredients.\n3. Evaluate how well the available ingredients fit the chosen recipe, considering substitutions if needed.\n4. Clearly outline the recipe with all required steps and quantities.\n5. List any additional ingredients needed (i.e., the missing ingredients that are required for the recipe but are not available) with the quantity required.\n\n# Output Requirements\n- Always return a valid JSON format result.\n- Avoid null values. If any value cannot be provided, use a reasonable default.\n\n# Output Format\n\nThe output should be a JSON object with the following structure:\n- recipe_name: A descriptive name for the recipe.\n- description: A brief description of the recipe.\n- ingredients: An array of objects, each with item_name, quantity, and unit.\n- steps: An array of strings, each a step in the preparation process.\n- missing_ingredients: An array of objects, each with item_name, quantity, and unit, detailing ingredients needed for the recipe that are not available."
+            },
+            {
+                "role": "user",
+                "content": json.dumps(ingredients)
+            }
+        ],
+        temperature=1,
+        max_tokens=2048,
+        top_p=1,
+        frequency_penalty=0,
+        presence_penalty=0,
+        response_format={"type": "json_object"}
+    )
+
+def recipe_task(kind):
+    return 'custom_recipe' if kind == 'custom' else 'recipe'
+
+RECIPE_FIELDS = {'recipe_name': str, 'description': str, 'ingredients': list, 'steps': list, 'missing_ingredients': list}
+
+# Parse a recipe completion and check it has everything the Recipes page renders. JSON repair
+# can close off an answer cut short at max_tokens, so a truncated answer is rejected outright.
+def parse_recipe(content, finish_reason=None):
+    if finish_reason == 'length':
+        raise InvalidRecipe('Recipe was cut off before it was complete')
+    recipe = parse_json_completion(content)
+    if not isinstance(recipe, dict):
+        raise InvalidRecipe('Recipe is not a JSON object')
+    for field, kind in RECIPE_FIELDS.items():
+        if not isinstance(recipe.get(field), kind):
+            raise InvalidRecipe(f'Recipe is missing {field}')
+    return recipe
+
+def recipe_from_response(response):
+    choice = response.choices[0]
+    return parse_recipe(choice.message.content.strip(), getattr(choice, 'finish_reason', None))
+
+# Rejected recipes count as failures, so the router falls back to the next model instead of returning them
+def generate_validated_recipe(kind, completion_args):
+    return recipe_from_response(llm.chat(recipe_task(kind), validate=recipe_from_response, **completion_args))
+
+# Used by the background workers that precompute recipe suggestions
+def generate_recipe_suggestion(kind, ingredients, options):
+    if kind == 'custom':
+        completion_args = custom_recipe_completion_args(ingredients, **(options or {}))
+    else:
+        completion_args = recipe_completion_args(ingredients)
+    return generate_validated_recipe(kind, completion_args)
+
+# The ingredient list the Recipes page sends: every item, as the inventory route formats it,
+# or with max_ingredients=K the K closest to expiry
+def load_recipe_ingredients(username, max_ingredients=None):
+    items = items_collection.find({'username': username}, {'item_name': 1, 'expiry_date': 1})
+    if max_ingredients:
+        items = items.sort(INVENTORY_SORTS['expiry_date']).limit(max_ingredients)
+    return [{"item_name": item["item_name"], "expiry_date": format_expiry_date(item["expiry_date"])} for item in items]
+
+recipe_suggestions = RecipeSuggestionCache(
+    db.recipe_suggestions,
+    ThreadPoolExecutor(max_workers=2, thread_name_prefix='recipe'),
+    generate_recipe_suggestion,
+    load_recipe_ingredients,
+    acquire=lambda username: warmup_admission.acquire('recipe_warmup', username)
+)
+
+# Serve a recipe from the suggestion cache, or generate it (streamed if asked) and store it
+def respond_with_recipe(data, kind, ingredients, completion_args, options=None, error_message='Failed to generate recipe'):
+    current_user = get_jwt_identity()
+    fingerprint = inventory_fingerprint(ingredients)
+    # Kept with the suggestion so the background refresh rebuilds it from the same number of items
+    max_ingredients = recipe_ingredient_limit(data)
+
+    # "Generate New Recipe" sends regenerate to skip the cached suggestion
+    if not data.get('regenerate'):
+        cached_recipe = recipe_suggestions.get(current_user, kind, fingerprint, options)
+        if cached_recipe is not None:
+            if wants_stream(data):
+                return stream_cached(cached_recipe)
+            response = jsonify(cached_recipe)
+            response.headers['X-Cache'] = 'HIT'
+            return response, 200
+
+    if wants_stream(data):
+        return stream_completion(
+            recipe_task(kind), completion_args, final_event='recipe',
+            on_complete=lambda recipe: recipe_suggestions.put(current_user, kind, fingerprint, recipe, options, max_ingredients=max_ingredients),
+            parse=parse_recipe, fallback=lambda: generate_validated_recipe(kind, completion_args)
+        )
+
+    try:
+        recipe_json = generate_validated_recipe(kind, completion_args)
+    except InvalidRecipe:
+        return jsonify({'error': error_message}), 500
+    recipe_suggestions.put(current_user, kind, fingerprint, recipe_json, options, max_ingredients=max_ingredients)
+    response = jsonify(recipe_json)
+    response.headers['X-Cache'] = 'MISS'
+    return response, 200
+
 # Route to generate custom recipe using LLM
 @app.route('/api/generate-custom-recipe', methods=['POST'])
 @jwt_required()
+@admission_controlled('recipe')
 def generate_custom_recipe():
     try:
         data = request.json
-        ingredients = data.get('ingredients')
-        ingredients = [{"item_name": item["item_name"], "expiry_date": item["expiry_date"]} for item in ingredients]
-        dietary_restrictions = data.get('dietary_restrictions', [])
-        cuisine = data.get('cuisine', '')
-        special_requests = data.get('special_requests', '')
+        ingredients = select_recipe_ingredients(data)
+        options = {
+            'dietary_restrictions': data.get('dietary_restrictions', []),
+            'cuisine': data.get('cuisine', ''),
+            'special_requests': data.get('special_requests', '')
+        }
 
         if not ingredients:
             return jsonify({'error': 'No ingredients provided'}), 400
 
-        # Update prompt to include dietary restrictions, cuisine, and special requests
-        system_content = "Take an input in JSON format containing a list of ingredients (item_name, expiry_date). Generate a recipe using these ingredients.\n\nTo create the recipe:\n- Minimize the use of unavailable ingredients.\n- Prioritize ingredients nearing expiry.\n- Ensure recipes are specific.\n- Include missing ingredients (those required but not available) with quantities.\n\nConsider user preferences:\n" + f"- Dietary Restrictions: {', '.join(dietary_restrictions) if dietary_restrictions else 'None'}\n" + f"- Preferred Cuisine: {cuisine}\n" + f"- Special Requests: {special_requests}\n" + "# Output Format\n\nThe output should be a JSON object:\n- recipe_name: Name of the recipe.\n- description: Brief description.\n- ingredients: Array of objects (item_name, quantity, unit).\n- steps: Array of preparation steps.\n- missing_ingredients: Array of missing ingredients (item_name, quantity, unit)."
-        
         # Use LLM to generate a custom recipe
-        response = gpt_client.chat.completions.create(
-            model="gemma2-9b-it",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_content
-                },
-                {
-                    "role": "user",
-                    "content": json.dumps(ingredients)
-                }
-            ],
-            temperature=1,
-            max_tokens=2048,
-            top_p=1,
-            frequency_penalty=0,
-            presence_penalty=0,
-            response_format={"type": "json_object"}
-        )
-
-        if response and response.choices:
-            recipe_data = response.choices[0].message.content.strip()
-            print(recipe_data)
-            recipe_json = json.loads(recipe_data)
-            return jsonify(recipe_json), 200
-        else:
-            return jsonify({'error': 'Failed to generate custom recipe'}), 500
+        completion_args = custom_recipe_completion_args(ingredients, **options)
+        return respond_with_recipe(data, 'custom', ingredients, completion_args, options, 'Failed to generate custom recipe')
 
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/generate-recipe', methods=['POST'])
 @jwt_required()
+@admission_controlled('recipe')
 def generate_recipe():
     try:
         data = request.json
-        ingredients = data.get('ingredients')
-        ingredients = [{"item_name": item["item_name"], "expiry_date": item["expiry_date"]} for item in ingredients]
+        ingredients = select_recipe_ingredients(data)
 
         if not ingredients:
             return jsonify({'error': 'No ingredients provided'}), 400
 
         # Use LLM to generate a recipe
-        response = gpt_client.chat.completions.create(
-            model="mixtral-8x7b-32768",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Take an input in a JSON format containing a list of ingredients with properties: item_name and expiry_date. Generate a recipe that can be made with these ingredients.\n\nTo create a recipe:\n- Minimize the use of ingredients not already available.\n- Prioritize using ingredients with upcoming expiry dates.\n- Ensure recipes are specific and not vague.\n\n# Steps\n\n1. Analyze the list of available ingredients, focusing on those nearing expiry.\n2. Identify potential recipes that can be made with the given ingredients.\n3. Evaluate how well the available ingredients fit the chosen recipe, considering substitutions if needed.\n4. Clearly outline the recipe with all required steps and quantities.\n5. List any additional ingredients needed (i.e., the missing ingredients that are required for the recipe but are not available) with the quantity required.\n\n# Output Requirements\n- Always return a valid JSON format result.\n- Avoid null values. If any value cannot be provided, use a reasonable default.\n\n# Output Format\n\nThe output should be a JSON object with the following structure:\n- recipe_name: A descriptive name for the recipe.\n- description: A brief description of the recipe.\n- ingredients: An array of objects, each with item_name, quantity, and unit.\n- steps: An array of strings, each a step in the preparation process.\n- missing_ingredients: An array of objects, each with item_name, quantity, and unit, detailing ingredients needed for the recipe that are not available."
-                },
-                {
-                    "role": "user",
-                    "content": json.dumps(ingredients)
-                }
-            ],
-            temperature=1,
-            max_tokens=2048,
-            top_p=1,
-            frequency_penalty=0,
-            presence_penalty=0,
-            response_format={"type": "json_object"}
-        )
-
-        if response and response.choices:
-            recipe_data = response.choices[0].message.content.strip()
-            print(recipe_data)
-            recipe_json = json.loads(recipe_data)
-            return jsonify(recipe_json), 200
-        else:
-            return jsonify({'error': 'Failed to generate recipe'}), 500
+        return respond_with_recipe(data, 'recipe', ingredients, recipe_completion_args(ingredients))
 
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# Create indexes up front; don't stop the app from booting if Mongo is unreachable
+def ensure_indexes():
+    try:
+        ensure_inventory_indexes(items_collection)
+        barcode_cache.ensure_indexes()
+        item_info_cache.ensure_indexes()
+        recipe_suggestions.ensure_indexes()
+        conversations.ensure_indexes()
+        inventory_changes.ensure_indexes()
+    except PyMongoError as e:
+        print(f'Failed to create indexes: {e}')
+
+ensure_indexes()
+
+# Migrations rewrite items in place without logging them, so bump each affected inventory;
+# the gap this leaves in the change log sends clients back to a full refetch
+def bump_inventory_versions(usernames):
+    for username in usernames:
+        inventory_changes.record(username)
+
+# One-off migration: flask --app app migrate-expiry-dates
+@app.cli.command('migrate-expiry-dates')
+def migrate_expiry_dates():
+    migrated, skipped, usernames = 0, 0, set()
+    for item in items_collection.find({'expiry_date': {'$type': 'string'}}, {'expiry_date': 1, 'username': 1}):
+        expiry_date = parse_expiry_date(item['expiry_date'])
+        if expiry_date is None:
+            print(f"Skipping item {item['_id']}: unreadable expiry date {item['expiry_date']!r}")
+            skipped += 1
+            continue
+        items_collection.update_one({'_id': item['_id']}, {'$set': {'expiry_date': expiry_date}})
+        usernames.add(item['username'])
+        migrated += 1
+    bump_inventory_versions(usernames)
+    print(f'Converted {migrated} expiry dates ({skipped} skipped)')
+
+# One-off migration: flask --app app migrate-images
+@app.cli.command('migrate-images')
+def migrate_images():
+    migrated, usernames = 0, set()
+    for item in items_collection.find({'image': {'$regex': '^data:'}}, {'image': 1, 'username': 1}):
+        try:
+            image_hash = image_store.put_data_url(item['image'])
+        except InvalidImage as e:
+            print(f"Skipping item {item['_id']}: {e}")
+            continue
+        items_collection.update_one({'_id': item['_id']}, {'$set': {'image_hash': image_hash}, '$unset': {'image': ''}})
+        usernames.add(item['username'])
+        migrated += 1
+    bump_inventory_versions(usernames)
+    print(f'Moved {migrated} inline images into the image store')
+
+# One-off migration: flask --app app backfill-name-keys
+# --all recomputes existing keys too, e.g. after the matching rules change
+@app.cli.command('backfill-name-keys')
+@click.option('--all', 'recompute', is_flag=True, help='Recompute keys that are already set')
+def backfill_name_keys(recompute):
+    migrated, usernames = 0, set()
+    query = {} if recompute else {'name_key': {'$exists': False}}
+    for item in items_collection.find(query, {'item_name': 1, 'username': 1, 'name_key': 1, 'name_tokens': 1}):
+        name_key, name_tokens = item_names.canonicalize(item.get('item_name') or '')
+        if item.get('name_key') == name_key and item.get('name_tokens') == name_tokens:
+            continue
+        items_collection.update_one({'_id': item['_id']}, {'$set': {'name_key': name_key, 'name_tokens': name_tokens}})
+        usernames.add(item['username'])
+        migrated += 1
+    bump_inventory_versions(usernames)
+    print(f'Updated name keys on {migrated} items')
+
+# Bulk-load an Open Food Facts export (JSONL or CSV, optionally gzipped): flask --app app import-products <path>
+@app.cli.command('import-products')
+@click.argument('path')
+@click.option('--batch-size', default=1000, show_default=True, help='Products upserted per bulk write')
+def import_products(path, batch_size):
+    imported = product_catalog.import_products(
+        iter_product_dump(path), batch_size=batch_size,
+        progress=lambda count: print(f'{count} products imported...') if count % (batch_size * 50) == 0 else None
+    )
+    print(f'Imported {imported} products into the catalog')
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=8000)
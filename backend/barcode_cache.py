@@ -0,0 +1,169 @@
+import datetime
+import threading
+
+from pymongo.errors import PyMongoError
+
+from timeutil import utcnow
+from ttl_cache import TTLCache
+
+
+class BarcodeCache:
+    """Two-level cache for barcode lookups.
+
+    A bounded in-process LRU sits in front of a MongoDB collection shared by
+    every worker. Found products and "not found" answers are both cached,
+    the latter with a shorter TTL. Upstream errors are never cached.
+
+    A cached "not found" is only as good as the sources behind it. If
+    recheck is given (a cheap local lookup, like the product catalog), it is
+    consulted before a negative answer is served, so products imported since
+    are found without waiting out the negative TTL in every worker.
+    """
+
+    def __init__(self, fetch, collection=None, maxsize=4096, ttl=7 * 24 * 3600, negative_ttl=24 * 3600, recheck=None):
+        # fetch(barcode) and recheck(barcode) return {'name', 'image'} or None when the product is unknown
+        self.fetch = fetch
+        self.recheck = recheck
+        self.collection = collection
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._memory = TTLCache(maxsize)  # barcode -> product or None
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'mongo_hits': 0, 'negative_hits': 0, 'rechecked': 0, 'misses': 0}
+
+    def ensure_indexes(self):
+        if self.collection is not None:
+            # Let Mongo drop stale entries on its own
+            self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def lookup(self, barcode):
+        found, product = self._memory.get(barcode)
+        if found:
+            self._count('memory_hits', product)
+            return product if product is not None else self._recheck(barcode)
+
+        found, product, remaining = self._get_mongo(barcode)
+        if found:
+            self._count('mongo_hits', product)
+            self._memory.set(barcode, product, remaining)
+            return product if product is not None else self._recheck(barcode)
+
+        with self._lock:
+            self._stats['misses'] += 1
+        product = self.fetch(barcode)
+        self._store(barcode, product)
+        return product
+
+    def lookup_many(self, barcodes, executor):
+        # Resolve a batch of barcodes: memory first, then one Mongo query for
+        # the rest, then the remaining misses fetched concurrently on executor.
+        # Returns ({barcode: product or None}, {barcode: exception}).
+        results = {}
+        pending = []
+        for barcode in barcodes:
+            found, product = self._memory.get(barcode)
+            if found:
+                self._count('memory_hits', product)
+                results[barcode] = product if product is not None else self._recheck(barcode)
+            else:
+                pending.append(barcode)
+
+        for barcode, (product, remaining) in self._get_mongo_many(pending).items():
+            self._count('mongo_hits', product)
+            self._memory.set(barcode, product, remaining)
+            results[barcode] = product if product is not None else self._recheck(barcode)
+        pending = [barcode for barcode in pending if barcode not in results]
+
+        errors = {}
+        with self._lock:
+            self._stats['misses'] += len(pending)
+        futures = {barcode: executor.submit(self.fetch, barcode) for barcode in pending}
+        for barcode, future in futures.items():
+            try:
+                product = future.result()
+            except Exception as e:
+                errors[barcode] = e
+                continue
+            self._store(barcode, product)
+            results[barcode] = product
+        return results, errors
+
+    def invalidate(self, barcode):
+        self._memory.pop(barcode)
+        if self.collection is not None:
+            try:
+                self.collection.delete_one({'_id': barcode})
+            except PyMongoError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = len(self._memory)
+        stats['evictions'] = self._memory.evictions
+        lookups = stats['memory_hits'] + stats['mongo_hits'] + stats['misses']
+        stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _count(self, key, product):
+        with self._lock:
+            self._stats[key] += 1
+            if product is None:
+                self._stats['negative_hits'] += 1
+
+    def _recheck(self, barcode):
+        if self.recheck is None:
+            return None
+        product = self.recheck(barcode)
+        if product is not None:
+            with self._lock:
+                self._stats['rechecked'] += 1
+            self._store(barcode, product)
+        return product
+
+    def _ttl_for(self, product):
+        return self.ttl if product is not None else self.negative_ttl
+
+    def _get_mongo(self, barcode):
+        if self.collection is None:
+            return False, None, 0
+        try:
+            doc = self.collection.find_one({'_id': barcode})
+        except PyMongoError:
+            return False, None, 0
+        if not doc:
+            return False, None, 0
+        # The TTL monitor only runs once a minute, so double-check expiry here
+        remaining = (doc['expires_at'] - utcnow()).total_seconds()
+        if remaining <= 0:
+            return False, None, 0
+        return True, doc.get('product'), remaining
+
+    def _get_mongo_many(self, barcodes):
+        if self.collection is None or not barcodes:
+            return {}
+        try:
+            docs = list(self.collection.find({'_id': {'$in': barcodes}}))
+        except PyMongoError:
+            return {}
+        now = utcnow()
+        found = {}
+        for doc in docs:
+            remaining = (doc['expires_at'] - now).total_seconds()
+            if remaining > 0:
+                found[doc['_id']] = (doc.get('product'), remaining)
+        return found
+
+    def _store(self, barcode, product):
+        ttl = self._ttl_for(product)
+        self._memory.set(barcode, product, ttl)
+        if self.collection is None:
+            return
+        try:
+            self.collection.replace_one(
+                {'_id': barcode},
+                {'_id': barcode, 'product': product, 'expires_at': utcnow() + datetime.timedelta(seconds=ttl)},
+                upsert=True
+            )
+        except PyMongoError:
+            pass
@@ -0,0 +1,141 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeServer:
+    """A stand-in upstream running on a background thread on 127.0.0.1."""
+
+    def __init__(self, handler):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def count(self):
+        with self._lock:
+            self.calls += 1
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+# BarcodeLookup stand-in: ~10% of barcodes are unknown, the rest resolve to a product
+class BarcodeLookupHandler(_QuietHandler):
+    def do_GET(self):
+        fake = self.server.fake
+        fake.count()
+        time.sleep(fake.latency)
+        barcode = parse_qs(urlparse(self.path).query).get('barcode', [''])[0]
+        if barcode.endswith('0'):
+            self.send_json(404, {'products': []})
+            return
+        self.send_json(200, {'products': [{
+            'title': f'Test Product {barcode}',
+            'images': [f'https://images.example.com/{barcode}.jpg']
+        }]})
+
+
+def barcode_lookup_server(latency=0.15):
+    fake = FakeServer(BarcodeLookupHandler)
+    fake.latency = latency
+    return fake
+
+
+def _completion_content(body):
+    # Answer in the shape each route expects, keyed off its system prompt
+    messages = body.get('messages', [])
+    system = messages[0]['content'] if messages and isinstance(messages[0].get('content'), str) else ''
+    user = messages[-1]['content'] if messages else ''
+    if 'for each item in a list' in system:
+        items = json.loads(user).get('items', [])
+        return json.dumps({'items': [
+            {'id': item['id'], 'dietary_compatible': 'yes', 'estimated_expiry_date': '2030-01-01', 'shelf_life_days': 7}
+            for item in items
+        ]})
+    if 'estimated expiry date for the item' in system:
+        return json.dumps({'dietary_compatible': random.choice(['yes', 'no']), 'estimated_expiry_date': '2030-01-01', 'shelf_life_days': 7})
+    if 'Generate a recipe' in system:
+        return json.dumps({
+            'recipe_name': 'Benchmark Stir Fry',
+            'description': 'A quick stir fry.',
+            'ingredients': [{'item_name': 'rice', 'quantity': 1, 'unit': 'cup'}],
+            'steps': ['Cook the rice.', 'Stir fry everything.'],
+            'missing_ingredients': []
+        })
+    if isinstance(user, list):
+        return json.dumps({'item_name': 'Orange', 'allergens': []})
+    return 'Bake it at 350F for about 30 minutes, until a toothpick comes out clean. ' * 3
+
+
+# OpenAI-compatible /chat/completions stand-in with per-model latency and token-by-token streaming
+class LLMHandler(_QuietHandler):
+    def do_POST(self):
+        fake = self.server.fake
+        fake.count()
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        model = body.get('model', 'unknown')
+        content = _completion_content(body)
+        time.sleep(fake.latency.get(model, fake.default_latency))
+
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:12]}'
+        if not body.get('stream'):
+            self.send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 100, 'completion_tokens': len(content) // 4, 'total_tokens': 100 + len(content) // 4}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for start in range(0, len(content), 16):
+            chunk = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'delta': {'content': content[start:start + 16]}, 'finish_reason': None}]
+            }
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(fake.token_delay)
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def llm_server(latency=None, default_latency=0.8, token_delay=0.01):
+    fake = FakeServer(LLMHandler)
+    fake.latency = dict(latency or {})
+    fake.default_latency = default_latency
+    fake.token_delay = token_delay
+    return fake
@@ -0,0 +1,89 @@
+"""Microbenchmark: JSON encoding and LLM-output parsing, old setup vs json_provider.
+
+Run from backend/:
+
+    python -m bench.json_bench --items 2000 --repeat 200
+
+"Old setup" is what the app did before: serialize items by hand, then
+stdlib json with the ObjectId-aware JSONEncoder (and Flask's default
+provider, which is what actually ran once json_encoder stopped being
+honoured). Parsing compares json.loads with json_provider.loads on a
+recipe-sized completion.
+"""
+import argparse
+import datetime
+import json
+import timeit
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+
+
+class JSONEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return super().default(o)
+
+
+def make_items(count):
+    today = datetime.datetime(2026, 1, 1)
+    return [{
+        '_id': ObjectId(),
+        'item_name': f'Chobani Greek Yogurt, 5.3 oz, {n} pack',
+        'expiry_date': today + datetime.timedelta(days=n % 30),
+        'image': f'https://images.example.com/{n}.jpg',
+        'barcode': f'{n:012d}'
+    } for n in range(count)]
+
+
+def serialize_by_hand(items):
+    return [{**item, '_id': str(item['_id']), 'expiry_date': item['expiry_date'].date().isoformat()} for item in items]
+
+
+RECIPE_COMPLETION = json.dumps({
+    'recipe_name': 'Spinach and Feta Omelette',
+    'description': 'A quick omelette using eggs and spinach that expire soon.',
+    'ingredients': [{'item_name': f'ingredient {n}', 'quantity': n, 'unit': 'g'} for n in range(12)],
+    'steps': [f'Step {n}: do something reasonable with the ingredients.' for n in range(8)],
+    'missing_ingredients': [{'item_name': 'feta', 'quantity': 50, 'unit': 'g'}]
+})
+
+
+def best_of(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    items = make_items(args.items)
+    flask_default = DefaultJSONProvider(Flask(__name__))
+    fast = json_provider.FastJSONProvider(Flask(__name__))
+
+    results = {
+        'encode: by hand + json.dumps(cls=JSONEncoder)': lambda: json.dumps(serialize_by_hand(items), cls=JSONEncoder),
+        'encode: by hand + Flask DefaultJSONProvider': lambda: flask_default.dumps(serialize_by_hand(items)),
+        'encode: FastJSONProvider (raw documents)': lambda: fast.dumps(items),
+        'encode: iter_json_array (streamed)': lambda: b''.join(json_provider.iter_json_array(items)),
+        'parse: json.loads (completion)': lambda: json.loads(RECIPE_COMPLETION),
+        'parse: parse_json_completion': lambda: json_provider.parse_json_completion(RECIPE_COMPLETION),
+    }
+    backend = 'orjson' if json_provider.orjson is not None else 'stdlib fallback'
+    print(f'json_provider backend: {backend}; {args.items} items, best of {args.repeat}')
+    baselines = {}
+    for name, fn in results.items():
+        elapsed = best_of(fn, args.repeat)
+        # Speedups are relative to the first (old-setup) row of each group
+        baseline = baselines.setdefault(name.split(':')[0], elapsed)
+        print(f'{name:<50}{elapsed:>10.3f} ms{baseline / elapsed:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
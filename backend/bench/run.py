@@ -0,0 +1,304 @@
+"""Hermetic load test for the backend.
+
+Starts the Flask app in-process against mongomock (or a local mongod via
+--mongo-uri), a stub BarcodeLookup server and a fake OpenAI-compatible
+server with configurable latency. It then replays a weighted mix of
+login, barcode, add-item, inventory and recipe traffic, and reports
+throughput and p50/p95/p99 latency per route.
+
+Run from backend/:
+
+    python -m bench.run --duration 30 --concurrency 16 --output bench_results/baseline.json
+    python -m bench.run --duration 30 --concurrency 16 --compare bench_results/baseline.json
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from bench.fakes import barcode_lookup_server, llm_server
+
+# (route name, weight); weights are relative shares of the traffic mix
+TRAFFIC_MIX = [
+    ('login', 3),
+    ('barcode', 25),
+    ('barcodes_batch', 3),
+    ('get_item_info', 15),
+    ('add_item', 15),
+    ('inventory', 20),
+    ('inventory_page', 5),
+    ('inventory_expiring', 5),
+    ('generate_recipe', 5),
+    ('chat_recipe', 4),
+]
+
+ITEM_NAMES = [
+    'Whole Milk 1 gal', 'Greek Yogurt 5.3 oz', 'Large Eggs 12 ct', 'Sourdough Bread', 'Baby Spinach',
+    'Chicken Breast', 'Cheddar Cheese', 'Bananas', 'Avocado', 'Orange Juice', 'Butter', 'Tofu',
+    'Ground Beef', 'Strawberries', 'Romaine Lettuce', 'Tortillas', 'Salsa', 'Hummus', 'Carrots', 'Apples'
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class LoadTest:
+    def __init__(self, base_url, args):
+        self.base_url = base_url
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.samples = {name: [] for name, _ in TRAFFIC_MIX}
+        self.errors = {name: 0 for name, _ in TRAFFIC_MIX}
+        self.rejected = {name: 0 for name, _ in TRAFFIC_MIX}  # 429s from admission control
+        self.users = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Scans are heavily skewed toward a few popular products
+        self.barcodes = [f'0{code:011d}' for code in range(1, args.barcodes + 1)]
+        self.barcode_weights = [1 / rank for rank in range(1, len(self.barcodes) + 1)]
+
+    @property
+    def client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = httpx.Client(base_url=self.base_url, timeout=120)
+        return self._local.client
+
+    def setup(self):
+        for n in range(self.args.users):
+            username, password = f'bench-user-{n}', 'bench-password'
+            self.client.post('/api/register', json={'username': username, 'password': password})
+            token = self.client.post('/api/login', json={'username': username, 'password': password}).json()['access_token']
+            user = {'username': username, 'password': password, 'headers': {'Authorization': f'Bearer {token}'}, 'conversation_id': None}
+            self.client.put('/api/user-info', json={'dietary_restrictions': ['vegetarian']}, headers=user['headers'])
+            for _ in range(self.args.initial_items):
+                self.client.post('/api/add-item', json=self.random_item(), headers=user['headers'])
+            self.users.append(user)
+
+    def random_item(self):
+        return {
+            'name': self.random.choice(ITEM_NAMES),
+            'image': f'https://images.example.com/{self.random.randint(1, 500)}.jpg',
+            'expiry_date': str(datetime.date.today() + datetime.timedelta(days=self.random.randint(-2, 30)))
+        }
+
+    def random_barcode(self):
+        return self.random.choices(self.barcodes, weights=self.barcode_weights)[0]
+
+    # One request per traffic class; each returns the httpx response to time
+
+    def do_login(self, user):
+        return self.client.post('/api/login', json={'username': user['username'], 'password': user['password']})
+
+    def do_barcode(self, user):
+        return self.client.get(f'/api/barcode/{self.random_barcode()}', headers=user['headers'])
+
+    def do_barcodes_batch(self, user):
+        barcodes = [self.random_barcode() for _ in range(self.random.randint(5, 15))]
+        return self.client.post('/api/barcodes', json={'barcodes': barcodes}, headers=user['headers'])
+
+    def do_get_item_info(self, user):
+        return self.client.post('/api/get-item-info', json={'item_name': self.random.choice(ITEM_NAMES)}, headers=user['headers'])
+
+    def do_add_item(self, user):
+        return self.client.post('/api/add-item', json=self.random_item(), headers=user['headers'])
+
+    def do_inventory(self, user):
+        return self.client.get('/api/inventory', headers=user['headers'])
+
+    def do_inventory_page(self, user):
+        return self.client.get('/api/inventory?limit=20&sort=expiry_date', headers=user['headers'])
+
+    def do_inventory_expiring(self, user):
+        return self.client.get('/api/inventory/expiring?within=7d', headers=user['headers'])
+
+    def do_generate_recipe(self, user):
+        ingredients = self.client.get('/api/inventory?fields=item_name,expiry_date', headers=user['headers']).json()
+        return self.client.post('/api/generate-recipe', json={'ingredients': ingredients}, headers=user['headers'])
+
+    def do_chat_recipe(self, user):
+        payload = {'message': 'How long should I bake it?'}
+        if user['conversation_id']:
+            payload['conversation_id'] = user['conversation_id']
+        else:
+            payload.update(recipe_name='Benchmark Cake', description='A cake', ingredients=['flour', 'eggs'], steps=['Mix', 'Bake'])
+        response = self.client.post('/api/chat-recipe', json=payload, headers=user['headers'])
+        if response.status_code == 200 and isinstance(response.json(), dict):
+            user['conversation_id'] = response.json().get('conversation_id')
+        return response
+
+    def worker(self, deadline):
+        names = [name for name, _ in TRAFFIC_MIX]
+        weights = [weight for _, weight in TRAFFIC_MIX]
+        while time.monotonic() < deadline:
+            name = self.random.choices(names, weights=weights)[0]
+            user = self.random.choice(self.users)
+            started = time.perf_counter()
+            try:
+                status = getattr(self, f'do_{name}')(user).status_code
+            except httpx.HTTPError:
+                status = None
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.samples[name].append(elapsed_ms)
+                if status is None or status >= 500:
+                    self.errors[name] += 1
+                elif status == 429:
+                    self.rejected[name] += 1
+
+    def run(self):
+        deadline = time.monotonic() + self.args.duration
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            for _ in range(self.args.concurrency):
+                pool.submit(self.worker, deadline)
+
+    def report(self, wall_time):
+        routes = {}
+        for name, samples in self.samples.items():
+            samples = sorted(samples)
+            routes[name] = {
+                'requests': len(samples),
+                'errors': self.errors[name],
+                'rejected': self.rejected[name],
+                'throughput_rps': round(len(samples) / wall_time, 2),
+                'mean_ms': round(sum(samples) / len(samples), 2) if samples else 0.0,
+                'p50_ms': round(percentile(samples, 50), 2),
+                'p95_ms': round(percentile(samples, 95), 2),
+                'p99_ms': round(percentile(samples, 99), 2),
+            }
+        total = sum(route['requests'] for route in routes.values())
+        return {'total_requests': total, 'throughput_rps': round(total / wall_time, 2), 'routes': routes}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results):
+    print(f"{'route':<22}{'reqs':>7}{'errs':>6}{'429s':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, route in results['routes'].items():
+        print(f"{name:<22}{route['requests']:>7}{route['errors']:>6}{route['rejected']:>6}{route['throughput_rps']:>9}"
+              f"{route['p50_ms']:>10}{route['p95_ms']:>10}{route['p99_ms']:>10}")
+    print(f"total: {results['total_requests']} requests, {results['throughput_rps']} req/s")
+
+
+# Flag routes whose p95 grew, or whose throughput fell, by more than threshold percent
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, route in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if not before or not before['requests'] or not route['requests']:
+            continue
+        if before['p95_ms'] and route['p95_ms'] > before['p95_ms'] * (1 + threshold / 100):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {route['p95_ms']} ms")
+        if before['throughput_rps'] and route['throughput_rps'] < before['throughput_rps'] * (1 - threshold / 100):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {route['throughput_rps']} req/s")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load after setup')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent client threads')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--initial-items', type=int, default=25, help='inventory items per user before the run')
+    parser.add_argument('--barcodes', type=int, default=500, help='distinct barcodes in the scan pool')
+    parser.add_argument('--mongo-uri', help='use this mongod instead of mongomock (a scratch database is fine)')
+    parser.add_argument('--llm-latency', type=float, default=0.8, help='seconds before the fake LLM answers')
+    parser.add_argument('--vision-latency', type=float, default=2.0)
+    parser.add_argument('--token-delay', type=float, default=0.01, help='seconds between streamed chunks')
+    parser.add_argument('--barcode-latency', type=float, default=0.15)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--compare', help='baseline JSON to check for regressions (exit 1 if any)')
+    parser.add_argument('--threshold', type=float, default=10, help='regression threshold in percent')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    barcode_lookup = barcode_lookup_server(latency=args.barcode_latency).start()
+    llm = llm_server(
+        latency={'llama-3.2-90b-vision-preview': args.vision_latency},
+        default_latency=args.llm_latency, token_delay=args.token_delay
+    ).start()
+
+    os.environ['BARCODE_LOOKUP_API_URL'] = barcode_lookup.url
+    os.environ['LLM_BASE_URL'] = llm.url
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret-key-that-is-long-enough')
+    os.environ.setdefault('GROK_API_KEY', 'bench')
+    os.environ.setdefault('BARCODE_API_KEY', 'bench')
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+    else:
+        import mongomock
+        import mongomock.gridfs
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+        mongomock.gridfs.enable_gridfs_integration()
+
+    from werkzeug.serving import make_server
+    import app as backend
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    load_test = LoadTest(base_url, args)
+    load_test.setup()
+    started = time.monotonic()
+    load_test.run()
+    wall_time = time.monotonic() - started
+
+    results = load_test.report(wall_time)
+    results['meta'] = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'mongo': 'mongod' if args.mongo_uri else 'mongomock',
+        'upstream_calls': {'barcodelookup': barcode_lookup.calls, 'llm': llm.calls},
+        'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'mongo_uri')}
+    }
+    print_report(results)
+    print(f"upstream calls: {barcode_lookup.calls} barcode lookups, {llm.calls} LLM completions")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}')
+
+    server.shutdown()
+    barcode_lookup.stop()
+    llm.stop()
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print('Regressions against baseline:')
+            for regression in regressions:
+                print(f'  {regression}')
+            return 1
+        print('No regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
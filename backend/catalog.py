@@ -0,0 +1,126 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import threading
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from timeutil import utcnow
+
+IMPORT_BATCH_SIZE = 1000
+
+
+def _entry(product, source):
+    return {'$set': {'name': product['name'], 'image': product.get('image'), 'source': source, 'updated_at': utcnow()}}
+
+
+def normalize_barcode(barcode):
+    # Open Food Facts keys UPC-A codes as 13-digit EANs with a leading zero
+    barcode = str(barcode).strip()
+    if barcode.isdigit() and len(barcode) == 12:
+        return '0' + barcode
+    return barcode
+
+
+def _product_name(record):
+    name = (record.get('product_name') or record.get('product_name_en') or record.get('generic_name') or '').strip()
+    brand = (record.get('brands') or '').split(',')[0].strip()
+    if name and brand and brand.lower() not in name.lower():
+        name = f'{brand} {name}'
+    return name
+
+
+def _product_image(record):
+    return record.get('image_url') or record.get('image_front_url') or record.get('image_small_url') or None
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def iter_product_dump(path):
+    """Yield (barcode, {'name', 'image'}) from an Open Food Facts export.
+
+    Reads JSONL (.jsonl / .jsonl.gz) or the CSV/TSV export one line at a
+    time, so memory stays flat however large the dump is. Records without a
+    code or a name are skipped.
+    """
+    with _open_text(path) as f:
+        if '.jsonl' in path or '.ndjson' in path:
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            # The official "CSV" export is tab-separated and has very long fields
+            csv.field_size_limit(sys.maxsize)
+            header = f.readline()
+            delimiter = '\t' if '\t' in header else ','
+            records = csv.DictReader(f, fieldnames=next(csv.reader(io.StringIO(header), delimiter=delimiter)), delimiter=delimiter)
+        for record in records:
+            barcode = str(record.get('code') or '').strip()
+            name = _product_name(record)
+            if barcode and name:
+                yield normalize_barcode(barcode), {'name': name, 'image': _product_image(record)}
+
+
+class ProductCatalog:
+    """Local barcode -> product store, checked before the BarcodeLookup API.
+
+    Seeded in bulk from an open product dump (see import_products) and
+    filled in over time with whatever BarcodeLookup resolves. Unlike the
+    barcode cache, entries never expire.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0}
+
+    def get(self, barcode):
+        try:
+            doc = self.collection.find_one({'_id': normalize_barcode(barcode)}, {'name': 1, 'image': 1})
+        except PyMongoError:
+            doc = None
+        with self._lock:
+            self._stats['hits' if doc else 'misses'] += 1
+        return {'name': doc['name'], 'image': doc.get('image')} if doc else None
+
+    def put(self, barcode, product, source):
+        try:
+            self.collection.update_one({'_id': normalize_barcode(barcode)}, _entry(product, source), upsert=True)
+        except PyMongoError:
+            return
+        with self._lock:
+            self._stats['writes'] += 1
+
+    def import_products(self, products, batch_size=IMPORT_BATCH_SIZE, source='import', progress=None):
+        # Upsert (barcode, product) pairs in unordered batches; only one batch is held in memory
+        imported, batch = 0, []
+        for barcode, product in products:
+            batch.append(UpdateOne({'_id': normalize_barcode(barcode)}, _entry(product, source), upsert=True))
+            if len(batch) >= batch_size:
+                imported += self._write_batch(batch)
+                batch = []
+                if progress:
+                    progress(imported)
+        if batch:
+            imported += self._write_batch(batch)
+        return imported
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _write_batch(self, batch):
+        try:
+            result = self.collection.bulk_write(batch, ordered=False)
+        except BulkWriteError as e:
+            result = e.details
+            return result.get('nUpserted', 0) + result.get('nMatched', 0)
+        return result.upserted_count + result.matched_count
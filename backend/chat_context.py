@@ -0,0 +1,86 @@
+import uuid
+
+from pymongo import ASCENDING
+
+from timeutil import utcnow
+
+CHAT_WINDOW_TOKENS = 1200  # Budget for verbatim turns sent with each request
+CHAT_WINDOW_KEEP = 0.5  # When the window overflows, shrink it to this fraction of the budget
+CONVERSATION_TTL = 7 * 24 * 3600
+
+
+# Cheap token estimate (~4 characters per token); close enough for budgeting
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def count_message_tokens(messages):
+    # ~4 tokens of framing per message on top of its content
+    return sum(estimate_tokens(str(message.get('content', ''))) + 4 for message in messages)
+
+
+# Newest turns that fit in the budget (always at least the last one)
+def recent_window(turns, budget):
+    window, used = [], 0
+    for turn in reversed(turns):
+        tokens = count_message_tokens([turn])
+        if window and used + tokens > budget:
+            break
+        window.append(turn)
+        used += tokens
+    return list(reversed(window))
+
+
+class ConversationStore:
+    """Server-side recipe chats, so the client only sends the new message.
+
+    Each conversation keeps its recipe, a sliding window of recent turns and
+    a rolling summary of everything older. When the window grows past the
+    token budget, the oldest turns are folded into the summary. Prompt size
+    therefore stays roughly constant however long the chat runs.
+    """
+
+    def __init__(self, collection, summarize, window_tokens=CHAT_WINDOW_TOKENS):
+        self.collection = collection
+        self.summarize = summarize  # summarize(previous_summary, turns) -> str
+        self.window_tokens = window_tokens
+
+    def ensure_indexes(self):
+        self.collection.create_index([('username', ASCENDING), ('updated_at', ASCENDING)])
+        self.collection.create_index('updated_at', expireAfterSeconds=CONVERSATION_TTL)
+
+    def start(self, username, recipe):
+        now = utcnow()
+        conversation = {
+            '_id': uuid.uuid4().hex,
+            'username': username,
+            'recipe': recipe,
+            'summary': '',
+            'turns': [],
+            'created_at': now,
+            'updated_at': now
+        }
+        self.collection.insert_one(conversation)
+        return conversation
+
+    def load(self, conversation_id, username):
+        return self.collection.find_one({'_id': conversation_id, 'username': username})
+
+    def record(self, conversation, user_message, assistant_message):
+        turns = conversation['turns'] + [
+            {'role': 'user', 'content': user_message},
+            {'role': 'assistant', 'content': assistant_message}
+        ]
+        summary = conversation['summary']
+        if count_message_tokens(turns) > self.window_tokens:
+            kept = recent_window(turns, int(self.window_tokens * CHAT_WINDOW_KEEP))
+            evicted = turns[:len(turns) - len(kept)]
+            summary = self.summarize(summary, evicted)
+            turns = kept
+
+        self.collection.update_one(
+            {'_id': conversation['_id']},
+            {'$set': {'turns': turns, 'summary': summary, 'updated_at': utcnow()}}
+        )
+        conversation.update(turns=turns, summary=summary)
+        return conversation
@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import io
+
+import gridfs
+from PIL import Image
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+THUMBNAIL_SIZE = (256, 256)
+IMAGE_VARIANTS = ('full', 'thumb')
+VISION_MAX_EDGE = 1024
+VISION_TARGET_BYTES = 256 * 1024
+# Formats we store and serve, keyed by what Pillow detects; the client's claimed type is never trusted
+IMAGE_CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+# Split a data URL ("data:image/jpeg;base64,....") into (content type, raw bytes)
+def decode_data_url(data_url):
+    try:
+        header, encoded = data_url.split(',', 1)
+        content_type = header.split(';')[0].split(':')[1]
+        return content_type, base64.b64decode(encoded)
+    except (IndexError, ValueError):
+        raise InvalidImage('Malformed image data URL')
+
+
+def _open_image(image_bytes):
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+    except Exception:
+        raise InvalidImage('Unreadable image')
+    return image
+
+
+# Returns (content type detected from the bytes, JPEG thumbnail)
+def make_thumbnail(image_bytes):
+    image = _open_image(image_bytes)
+    content_type = IMAGE_CONTENT_TYPES.get(image.format)
+    if content_type is None:
+        raise InvalidImage('Unsupported image format')
+    image.thumbnail(THUMBNAIL_SIZE)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=80, optimize=True)
+    return content_type, out.getvalue()
+
+
+# 64-bit difference hash: survives re-encoding and small resizes, so a resubmitted photo maps to the same key
+def perceptual_hash(image):
+    pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f'{bits:016x}'
+
+
+# Downscale and recompress a photo for the vision model; returns (perceptual hash, JPEG bytes)
+def prepare_vision_image(image_bytes, max_edge=VISION_MAX_EDGE, target_bytes=VISION_TARGET_BYTES):
+    if len(image_bytes) > MAX_IMAGE_BYTES:
+        raise InvalidImage('Image too large')
+    image = _open_image(image_bytes)
+    image_hash = perceptual_hash(image)
+
+    image.thumbnail((max_edge, max_edge))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    # Step quality down until the JPEG fits the target size
+    for quality in (85, 75, 65, 55):
+        out = io.BytesIO()
+        image.save(out, format='JPEG', quality=quality, optimize=True)
+        if out.tell() <= target_bytes:
+            break
+    return image_hash, out.getvalue()
+
+
+class ImageStore:
+    """Content-addressed image blobs in GridFS.
+
+    Images are keyed by the SHA-256 of their bytes, so the same photo is
+    only stored once no matter how many items point at it. A small JPEG
+    thumbnail is generated once, on first upload, next to the original.
+    """
+
+    def __init__(self, db, bucket_name='images'):
+        self.bucket = gridfs.GridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f'{bucket_name}.files']
+
+    @staticmethod
+    def _file_id(image_hash, variant):
+        return image_hash if variant == 'full' else f'{image_hash}-{variant}'
+
+    def put(self, image_bytes):
+        if len(image_bytes) > MAX_IMAGE_BYTES:
+            raise InvalidImage('Image too large')
+        image_hash = hashlib.sha256(image_bytes).hexdigest()
+        if self.files.find_one({'_id': image_hash}, {'_id': 1}):
+            return image_hash
+
+        # Thumbnail first: it also checks that the bytes are really an image, and tells us which kind
+        content_type, thumbnail = make_thumbnail(image_bytes)
+        for variant, data, variant_type in (('thumb', thumbnail, 'image/jpeg'), ('full', image_bytes, content_type)):
+            try:
+                self.bucket.upload_from_stream_with_id(
+                    self._file_id(image_hash, variant), image_hash, data,
+                    metadata={'content_type': variant_type, 'variant': variant}
+                )
+            except gridfs.errors.FileExists:
+                pass  # Another worker stored the same image first
+        return image_hash
+
+    def put_data_url(self, data_url):
+        _, image_bytes = decode_data_url(data_url)
+        return self.put(image_bytes)
+
+    def get(self, image_hash, variant='full'):
+        # Returns (bytes, content type), or None if there's no such image
+        try:
+            grid_out = self.bucket.open_download_stream(self._file_id(image_hash, variant))
+        except gridfs.errors.NoFile:
+            return None
+        content_type = (grid_out.metadata or {}).get('content_type')
+        # Images stored before the type was detected server-side may carry whatever the client claimed
+        if content_type not in IMAGE_CONTENT_TYPES.values():
+            content_type = 'application/octet-stream'
+        return grid_out.read(), content_type
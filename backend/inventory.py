@@ -0,0 +1,207 @@
+import base64
+import datetime
+import json
+import re
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from timeutil import utcnow
+
+# Columns a client may ask for with ?fields=; _id is always returned
+INVENTORY_FIELDS = ('item_name', 'expiry_date', 'image', 'barcode')
+DEFAULT_INVENTORY_FIELDS = ('item_name', 'expiry_date', 'image')
+
+# Each sort key maps to the index that serves it, so listing never needs an in-memory sort
+INVENTORY_SORTS = {
+    '_id': [('_id', ASCENDING)],
+    'expiry_date': [('expiry_date', ASCENDING), ('_id', ASCENDING)]
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+EXPIRY_DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%d %B %Y', '%B %d, %Y')
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+# Turn whatever the client (or the LLM) sent into a naive UTC datetime; None if it can't be read
+def parse_expiry_date(value):
+    if isinstance(value, datetime.datetime):
+        expiry = value
+    elif isinstance(value, datetime.date):
+        expiry = datetime.datetime.combine(value, datetime.time())
+    elif isinstance(value, str) and value.strip():
+        value = value.strip()
+        try:
+            expiry = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            for date_format in EXPIRY_DATE_FORMATS:
+                try:
+                    expiry = datetime.datetime.strptime(value, date_format)
+                    break
+                except ValueError:
+                    continue
+            else:
+                return None
+    else:
+        return None
+    if expiry.tzinfo is not None:
+        expiry = expiry.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return expiry
+
+
+# Expiry dates go back out as plain YYYY-MM-DD strings, the format the frontend has always used
+def format_expiry_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    return value
+
+
+# "7d", "7" or "2w" -> timedelta
+def parse_within(value):
+    match = re.fullmatch(r'\s*(\d+)\s*([dw]?)\s*', value or '')
+    if not match:
+        raise InvalidQuery('within must look like 7d or 2w')
+    days = int(match.group(1)) * (7 if match.group(2) == 'w' else 1)
+    return datetime.timedelta(days=days)
+
+
+def ensure_inventory_indexes(collection):
+    collection.create_index([('username', ASCENDING), ('_id', ASCENDING)], name='username_id')
+    # _id is the keyset tie-breaker for equal expiry dates, so it has to be in the index too
+    collection.create_index([('username', ASCENDING), ('expiry_date', ASCENDING), ('_id', ASCENDING)], name='username_expiry_date_id')
+    collection.create_index([('username', ASCENDING), ('name_key', ASCENDING)], name='username_name_key')
+    # Multikey index over the name's tokens; serves /api/inventory/search
+    collection.create_index([('username', ASCENDING), ('name_tokens', ASCENDING)], name='username_name_tokens')
+    # Only items written with an idempotency key take part in the uniqueness check
+    collection.create_index(
+        [('username', ASCENDING), ('idempotency_key', ASCENDING)],
+        name='username_idempotency_key', unique=True,
+        partialFilterExpression={'idempotency_key': {'$type': 'string'}}
+    )
+
+
+# Unordered insert of built items, so one bad or duplicate document doesn't stop the rest. Returns one
+# (status, detail) per document: ('created', _id), ('duplicate', _id of the item already holding its
+# idempotency key) or ('error', message)
+def insert_items(collection, username, documents):
+    write_errors = {}
+    if documents:
+        try:
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {error['index']: error for error in e.details.get('writeErrors', [])}
+
+    duplicate_keys = [documents[i]['idempotency_key'] for i, error in write_errors.items() if error.get('code') == 11000]
+    existing = {}
+    if duplicate_keys:
+        for item in collection.find({'username': username, 'idempotency_key': {'$in': duplicate_keys}}, {'idempotency_key': 1}):
+            existing[item['idempotency_key']] = item['_id']
+
+    outcomes = []
+    for index, document in enumerate(documents):
+        error = write_errors.get(index)
+        if error is None:
+            outcomes.append(('created', document['_id']))
+        elif error.get('code') == 11000:
+            outcomes.append(('duplicate', existing.get(document['idempotency_key'])))
+        else:
+            outcomes.append(('error', error.get('errmsg', 'Write failed')))
+    return outcomes
+
+
+def build_projection(fields):
+    if not fields:
+        fields = DEFAULT_INVENTORY_FIELDS
+    else:
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in INVENTORY_FIELDS]
+        if unknown:
+            raise InvalidQuery(f'Unknown fields: {", ".join(unknown)}')
+    projection = {field: 1 for field in fields}
+    if 'image' in projection:
+        projection['image_hash'] = 1  # Images moved to the image store are referenced by hash
+    return projection
+
+
+def encode_cursor(sort, item):
+    if sort == 'expiry_date':
+        # Tag the type: migrated items hold datetimes, older ones may still hold strings
+        expiry = item.get('expiry_date')
+        if isinstance(expiry, datetime.datetime):
+            position = ['d', expiry.isoformat(), str(item['_id'])]
+        else:
+            position = ['s', expiry, str(item['_id'])]
+    else:
+        position = [str(item['_id'])]
+    return base64.urlsafe_b64encode(json.dumps(position, default=str).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(sort, cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        last_id = ObjectId(position[-1])
+    except Exception:
+        raise InvalidQuery('Invalid cursor')
+
+    if sort == 'expiry_date':
+        try:
+            last_expiry = datetime.datetime.fromisoformat(position[1]) if position[0] == 'd' else position[1]
+        except (IndexError, TypeError, ValueError):
+            raise InvalidQuery('Invalid cursor')
+        after = [
+            {'expiry_date': {'$gt': last_expiry}},
+            {'expiry_date': last_expiry, '_id': {'$gt': last_id}}
+        ]
+        if position[0] == 's':
+            after.append({'expiry_date': {'$type': 'date'}})  # BSON sorts every date after every string
+        return {'$or': after}
+    return {'_id': {'$gt': last_id}}
+
+
+# Keyset-paginated listing of one user's items: returns (items, next_cursor or None)
+def list_inventory_page(collection, username, sort='_id', cursor=None, limit=DEFAULT_PAGE_SIZE, fields=None):
+    if sort not in INVENTORY_SORTS:
+        raise InvalidQuery(f'Unsupported sort: {sort}')
+    query = {'username': username}
+    if cursor:
+        query.update(decode_cursor(sort, cursor))
+
+    projection = build_projection(fields)
+    if sort == 'expiry_date':
+        projection['expiry_date'] = 1  # Needed to build the next cursor
+
+    # Fetch one extra row to know whether there's another page
+    items = list(collection.find(query, projection).sort(INVENTORY_SORTS[sort]).limit(limit + 1))
+    next_cursor = encode_cursor(sort, items[limit - 1]) if len(items) > limit else None
+    return items[:limit], next_cursor
+
+
+# Items expiring before now + within, soonest first; served by the username+expiry_date+_id index
+def list_expiring(collection, username, within, limit=DEFAULT_PAGE_SIZE, fields=None, include_expired=True, now=None):
+    now = now or utcnow()
+    expiry_range = {'$lte': now + within}
+    if not include_expired:
+        expiry_range['$gte'] = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    projection = build_projection(fields)
+    projection['expiry_date'] = 1
+    return list(
+        collection.find({'username': username, 'expiry_date': expiry_range}, projection)
+        .sort(INVENTORY_SORTS['expiry_date'])
+        .limit(limit)
+    )
+
+
+# Items whose name has a token starting with each search token, soonest expiry first
+def search_inventory(collection, username, tokens, limit=DEFAULT_PAGE_SIZE, fields=None):
+    query = {'username': username}
+    if tokens:
+        query['$and'] = [{'name_tokens': {'$regex': '^' + re.escape(token)}} for token in tokens]
+    projection = build_projection(fields)
+    return list(collection.find(query, projection).sort(INVENTORY_SORTS['expiry_date']).limit(limit))
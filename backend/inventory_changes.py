@@ -0,0 +1,77 @@
+from pymongo import ASCENDING, ReturnDocument
+
+from timeutil import utcnow
+
+CHANGE_LOG_TTL = 30 * 24 * 3600  # Clients further behind than this refetch the whole inventory
+MAX_CHANGES = 1000  # Past this many entries a full refetch is cheaper than replaying the log
+
+
+class ChangeLogGap(Exception):
+    """The log no longer covers the requested version; the client has to refetch everything."""
+
+
+class InventoryChangeLog:
+    """Per-user inventory version and a log of what each version changed.
+
+    Every write to a user's inventory bumps their version and logs the items
+    it inserted or deleted under the new version. GET /api/inventory uses the
+    version as its ETag, and /api/inventory/changes replays the log. A bump
+    with nothing logged (e.g. from a migration) is a gap, and clients that
+    hit one start over from a full fetch.
+    """
+
+    def __init__(self, versions, changes):
+        self.versions = versions  # {_id: username, version}
+        self.changes = changes  # {username, version, op, item_id, created_at}
+
+    def ensure_indexes(self):
+        self.changes.create_index([('username', ASCENDING), ('version', ASCENDING)])
+        self.changes.create_index('created_at', expireAfterSeconds=CHANGE_LOG_TTL)
+
+    def version(self, username):
+        doc = self.versions.find_one({'_id': username}, {'version': 1})
+        return doc['version'] if doc else 0
+
+    def record(self, username, inserted_ids=(), deleted_ids=()):
+        # Call after the write itself, so a reader never sees a version newer than the data
+        doc = self.versions.find_one_and_update(
+            {'_id': username}, {'$inc': {'version': 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        version, now = doc['version'], utcnow()
+        entries = (
+            [{'username': username, 'version': version, 'op': 'insert', 'item_id': item_id, 'created_at': now} for item_id in inserted_ids]
+            + [{'username': username, 'version': version, 'op': 'delete', 'item_id': item_id, 'created_at': now} for item_id in deleted_ids]
+        )
+        if entries:
+            self.changes.insert_many(entries, ordered=False)
+        return version
+
+    def changes_since(self, username, since):
+        # Returns (current version, inserted item ids, deleted item ids), net of each other
+        current = self.version(username)
+        if since > current:
+            raise ValueError('since is ahead of the current inventory version')
+        if since == current:
+            return current, [], []
+        if current - since > MAX_CHANGES:
+            raise ChangeLogGap()
+
+        entries = list(
+            self.changes.find({'username': username, 'version': {'$gt': since, '$lte': current}}, {'version': 1, 'op': 1, 'item_id': 1})
+            .sort('version', ASCENDING)
+            .limit(MAX_CHANGES + 1)
+        )
+        # Versions are contiguous, so every one in (since, current] must have left at least one entry
+        if len(entries) > MAX_CHANGES or {entry['version'] for entry in entries} != set(range(since + 1, current + 1)):
+            raise ChangeLogGap()
+
+        inserted, deleted = {}, {}
+        for entry in entries:
+            if entry['op'] == 'insert':
+                inserted[entry['item_id']] = True
+                deleted.pop(entry['item_id'], None)
+            else:
+                inserted.pop(entry['item_id'], None)
+                deleted[entry['item_id']] = True
+        return current, list(inserted), list(deleted)
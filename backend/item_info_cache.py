@@ -0,0 +1,127 @@
+import datetime
+import hashlib
+import json
+import re
+import threading
+
+from pymongo.errors import PyMongoError
+
+from timeutil import utcnow
+from ttl_cache import TTLCache
+
+
+# "Whole Milk, 1 gal" and "whole milk 1 gal" should share one entry
+def normalize_item_name(item_name):
+    item_name = re.sub(r'[^a-z0-9]+', ' ', item_name.lower())
+    return ' '.join(item_name.split())
+
+
+# Stable hash of a restriction set; order, case and duplicates don't matter
+def restrictions_fingerprint(dietary_restrictions):
+    if not dietary_restrictions:
+        dietary_restrictions = []
+    elif isinstance(dietary_restrictions, str):
+        dietary_restrictions = dietary_restrictions.split(',')
+    restrictions = sorted({str(r).strip().lower() for r in dietary_restrictions if str(r).strip()})
+    return hashlib.sha1(json.dumps(restrictions).encode('utf-8')).hexdigest()[:16]
+
+
+class ItemInfoCache:
+    """Memoizes LLM item-info verdicts per (normalized item name, restriction set).
+
+    Shelf life is stored as a number of days rather than an absolute date, so
+    an entry written yesterday still yields the right expiry date today. The
+    in-process LRU can optionally be backed by a MongoDB collection so every
+    worker shares the same answers.
+    """
+
+    def __init__(self, collection=None, maxsize=2048, ttl=30 * 24 * 3600, normalize=normalize_item_name):
+        self.collection = collection
+        self.normalize = normalize  # item name -> cache key part
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize)
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'mongo_hits': 0, 'misses': 0}
+
+    def ensure_indexes(self):
+        if self.collection is not None:
+            self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def key(self, item_name, dietary_restrictions):
+        return f'{self.normalize(item_name)}|{restrictions_fingerprint(dietary_restrictions)}'
+
+    def get(self, item_name, dietary_restrictions, today=None):
+        key = self.key(item_name, dietary_restrictions)
+        found, entry = self._memory.get(key)
+        if found:
+            self._count('memory_hits')
+            return self._to_response(entry, today)
+
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one({'_id': key})
+            except PyMongoError:
+                doc = None
+            if doc:
+                remaining = (doc['expires_at'] - utcnow()).total_seconds()
+                if remaining > 0:
+                    entry = {'dietary_compatible': doc['dietary_compatible'], 'shelf_life_days': doc['shelf_life_days']}
+                    self._memory.set(key, entry, remaining)
+                    self._count('mongo_hits')
+                    return self._to_response(entry, today)
+
+        self._count('misses')
+        return None
+
+    def put(self, item_name, dietary_restrictions, item_info, today=None):
+        # Returns the normalized response, or None if the answer couldn't be cached
+        today = today or datetime.date.today()
+        shelf_life_days = self._shelf_life_days(item_info, today)
+        if shelf_life_days is None or item_info.get('dietary_compatible') not in ('yes', 'no'):
+            return None
+
+        key = self.key(item_name, dietary_restrictions)
+        entry = {'dietary_compatible': item_info['dietary_compatible'], 'shelf_life_days': shelf_life_days}
+        self._memory.set(key, entry, self.ttl)
+        if self.collection is not None:
+            try:
+                self.collection.replace_one(
+                    {'_id': key},
+                    {'_id': key, **entry, 'expires_at': utcnow() + datetime.timedelta(seconds=self.ttl)},
+                    upsert=True
+                )
+            except PyMongoError:
+                pass
+        return self._to_response(entry, today)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = len(self._memory)
+        stats['evictions'] = self._memory.evictions
+        return stats
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _shelf_life_days(item_info, today):
+        try:
+            return max(0, int(item_info['shelf_life_days']))
+        except (KeyError, TypeError, ValueError):
+            pass
+        try:
+            expiry_date = datetime.date.fromisoformat(str(item_info['estimated_expiry_date'])[:10])
+        except (KeyError, ValueError):
+            return None
+        return max(0, (expiry_date - today).days)
+
+    @staticmethod
+    def _to_response(entry, today):
+        today = today or datetime.date.today()
+        return {
+            'dietary_compatible': entry['dietary_compatible'],
+            'estimated_expiry_date': str(today + datetime.timedelta(days=entry['shelf_life_days'])),
+            'shelf_life_days': entry['shelf_life_days']
+        }
@@ -0,0 +1,175 @@
+import re
+import threading
+import time
+
+from pymongo.errors import PyMongoError
+
+# Package sizes and counts: "5.3 oz", "12 pack", "1/2 gal", "500g", "2x100ml", "12-ct"
+SIZE_PATTERN = re.compile(
+    r'\b\d+(?:[./]\d+)?\s*(?:x\s*\d+(?:[./]\d+)?\s*)?-?\s*'
+    r'(?:fl\.?\s*oz|oz|ounces?|lbs?|pounds?|kg|mg|g|grams?|ml|cl|l|liters?|litres?|gal|gallons?|qt|quarts?|pt|pints?'
+    r'|ct|count|pk|packs?|pcs|pieces?|servings?|cans?|bottles?|bags?)\b'
+)
+NOISE_TOKENS = {
+    'and', 'with', 'the', 'of', 'a', 'an', 'in', 'for', 'value', 'family', 'size', 'new', 'fresh', 'organic',
+    'oz', 'lb', 'gal', 'gallon', 'ct', 'count', 'pk', 'pack', 'ml', 'kg'  # Units left over without a number
+}
+# Edits a misspelled token may be away from a known word, by token length; shorter tokens must match
+# exactly, since "pea" and "tea" or "paste" and "pasta" are different products one letter apart
+TOKEN_EDITS = ((9, 2), (6, 1))
+RELOAD_INTERVAL = 300  # Seconds before re-reading keys other workers may have added
+
+
+def _singular(token):
+    if len(token) <= 3 or token.endswith('ss') or token.isdigit():
+        return token
+    if token.endswith('ies'):
+        return token[:-3] + 'y'
+    if token.endswith('oes'):
+        return token[:-2]
+    if token.endswith('s'):
+        return token[:-1]
+    return token
+
+
+# "Chobani Greek Yogurt, 5.3 oz, 12 pack" -> ['chobani', 'greek', 'yogurt']
+def tokenize_item_name(item_name):
+    text = SIZE_PATTERN.sub(' ', str(item_name).lower().replace('&', ' and '))
+    tokens = []
+    for token in re.sub(r'[^a-z0-9]+', ' ', text).split():
+        token = _singular(token)
+        if token in NOISE_TOKENS or token.isdigit() or token in tokens:
+            continue
+        tokens.append(token)
+    return tokens
+
+
+# Word order doesn't matter: "yogurt, greek" and "Greek Yogurt" share a key
+def item_name_key(item_name):
+    return ' '.join(sorted(tokenize_item_name(item_name)))
+
+
+# Word order does matter here: "milk chocolate" and "chocolate milk" are different products
+def ordered_item_name_key(item_name):
+    return ' '.join(tokenize_item_name(item_name))
+
+
+def _allowed_edits(token):
+    for length, edits in TOKEN_EDITS:
+        if len(token) >= length:
+            return edits
+    return 0
+
+
+# Optimal string alignment distance (a swap of neighbours is one edit), capped at limit + 1
+def edit_distance(a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return min(current[-1], limit + 1)
+
+
+class ItemNameCanonicalizer:
+    """Maps free-form item names onto canonical product keys.
+
+    A name is tokenized, stripped of sizes, units and filler words, and
+    singularized into a sorted token key. If that key isn't known yet, each
+    unknown token is corrected to a known word a small edit distance away,
+    and the corrected key is used if it names a known product, so
+    "greek yoghurt" lands on "greek yogurt". Tokens that are known words are
+    never rewritten, and whole names are never fuzzy-matched, so
+    "unsalted butter" stays apart from "salted butter". Known keys live in a
+    small collection shared by all workers and are mirrored in memory.
+
+    Sorted keys are right for search and grouping, but not for anything
+    that must tell "milk chocolate" from "chocolate milk"; use
+    ordered_item_name_key() for that.
+    """
+
+    def __init__(self, collection, reload_interval=RELOAD_INTERVAL):
+        self.collection = collection
+        self.reload_interval = reload_interval
+        self._keys = set()
+        self._by_token = {}  # token -> set of keys containing it
+        self._by_initial = {}  # first letter -> known words, the candidates for correcting a misspelled token
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def canonicalize(self, item_name, register=True):
+        # Returns (key, tokens); tokens covers both the name as written and its canonical key
+        tokens = tokenize_item_name(item_name)
+        match = self._match(tokens, register)
+        if not match:
+            return '', []
+        return match, sorted(set(tokens) | set(match.split()))
+
+    def _match(self, tokens, register):
+        key = ' '.join(sorted(tokens))
+        if not key:
+            return ''
+        self._maybe_reload()
+        with self._lock:
+            if key in self._keys:
+                return key
+            corrected = ' '.join(sorted({self._closest_word(token) for token in tokens}))
+            if corrected in self._keys:
+                return corrected
+        if register:
+            self._register(key)
+        return key
+
+    def correct_tokens(self, tokens):
+        # For search: leave tokens that prefix a known word alone, otherwise correct them like canonicalize() does
+        self._maybe_reload()
+        with self._lock:
+            vocabulary = list(self._by_token)
+            return [token if any(word.startswith(token) for word in vocabulary) else self._closest_word(token) for token in tokens]
+
+    def _closest_word(self, token):
+        # Called with the lock held. Known words and short tokens stay as they are, and so does a tie
+        limit = _allowed_edits(token)
+        if not limit or token in self._by_token:
+            return token
+        best, best_distance, tied = token, limit + 1, False
+        for word in self._by_initial.get(token[0], ()):
+            distance = edit_distance(token, word, limit)
+            if distance < best_distance:
+                best, best_distance, tied = word, distance, False
+            elif distance == best_distance:
+                tied = True
+        return token if tied or best_distance > limit else best
+
+    def _add(self, key):
+        self._keys.add(key)
+        for token in key.split():
+            self._by_token.setdefault(token, set()).add(key)
+            self._by_initial.setdefault(token[0], set()).add(token)
+
+    def _register(self, key):
+        with self._lock:
+            self._add(key)
+        try:
+            self.collection.insert_one({'_id': key})
+        except PyMongoError:
+            pass  # Includes another worker registering the same key first
+
+    def _maybe_reload(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reload_interval:
+            return
+        try:
+            keys = [doc['_id'] for doc in self.collection.find({}, {'_id': 1})]
+        except PyMongoError:
+            keys = []
+        with self._lock:
+            for key in keys:
+                self._add(key)
+            self._loaded_at = time.monotonic()
@@ -0,0 +1,137 @@
+import datetime
+import decimal
+import json
+import uuid
+
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; everything works on the stdlib json module too
+    orjson = None
+
+ARRAY_CHUNK_SIZE = 100  # Items per chunk when streaming a JSON array
+
+
+def _default(o):
+    if isinstance(o, (ObjectId, uuid.UUID, decimal.Decimal)):
+        return str(o)
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def dumps_bytes(obj):
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(s):
+        return orjson.loads(s)
+else:
+    def dumps_bytes(obj):
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(s):
+        return json.loads(s)
+
+
+def dumps(obj):
+    return dumps_bytes(obj).decode('utf-8')
+
+
+# Best-effort fix-up of almost-JSON from a model: drops surrounding prose and code fences,
+# trailing commas and anything after the top-level value, and closes what a cut-off answer left open
+def repair_json(content):
+    start = min((i for i in (content.find('{'), content.find('[')) if i != -1), default=-1)
+    if start == -1:
+        return None
+    out, closers, in_string, escaped = [], [], False, False
+    for char in content[start:]:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if not closers:
+                break
+            while out and out[-1] in ' \t\r\n,':
+                out.pop()  # Trailing comma before the closer
+            closers.pop()
+            out.append(char)
+            if not closers:
+                break
+            continue
+        out.append(char)
+
+    if in_string:
+        out.append('"')
+    text = ''.join(out).rstrip()
+    if closers:
+        # Cut back to the last complete value before closing what's still open
+        text = text.rstrip(',:').rstrip()
+        if closers[-1] == '}' and text.endswith('"'):
+            # A string with nothing after it inside an object is a key that never got its value
+            opening = len(text) - 2
+            while opening >= 0 and (text[opening] != '"' or text[opening - 1] == '\\'):
+                opening -= 1
+            if text[:opening].rstrip().endswith(('{', ',')):
+                text = text[:opening].rstrip().rstrip(',')
+    return text + ''.join(reversed(closers))
+
+
+# Pull the JSON object out of a completion, repairing it locally rather than asking the model again
+def parse_json_completion(content):
+    try:
+        return loads(content)
+    except ValueError:
+        repaired = repair_json(content)
+        if repaired is None:
+            raise
+        return loads(repaired)
+
+
+# Encode an iterable as a JSON array a chunk at a time, so a large listing is never held in memory whole
+def iter_json_array(items, chunk_size=ARRAY_CHUNK_SIZE):
+    yield b'['
+    first, chunk = True, []
+    for item in items:
+        chunk.append(dumps_bytes(item))
+        if len(chunk) >= chunk_size:
+            yield (b'' if first else b',') + b','.join(chunk)
+            first, chunk = False, []
+    if chunk:
+        yield (b'' if first else b',') + b','.join(chunk)
+    yield b']\n'
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson when it's installed.
+
+    Handles ObjectId and datetime values natively, which the old
+    app.json_encoder hook no longer did on Flask 2.3+. Output is compact and
+    keys keep their insertion order.
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,154 @@
+import contextlib
+import threading
+import time
+
+from pymongo import monitoring
+
+# Latency buckets in seconds, from a cached Mongo read up to a slow vision completion
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """In-process counters, gauges and latency histograms rendered in Prometheus text format.
+
+    Every gunicorn worker keeps its own registry, so each scrape reflects the
+    worker that answered it. Running a single worker with more threads keeps
+    the numbers whole.
+
+    Also collects a per-request breakdown (time spent in Mongo, the LLM,
+    bcrypt, ...) for the thread handling the current request, which the app
+    can return as a Server-Timing header.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._help = {}
+        self._types = {}
+        self._counters = {}  # name -> {label tuple -> value}; gauges live here too
+        self._histograms = {}  # name -> {label tuple -> [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def describe(self, name, kind, help_text):
+        self._types[name] = kind
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._types.setdefault(name, 'counter')
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._types.setdefault(name, 'gauge')
+            self._counters.setdefault(name, {})[key] = value
+
+    def observe(self, name, seconds, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._types.setdefault(name, 'histogram')
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    state[i] += 1
+            state[-2] += seconds
+            state[-1] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name, span=None, **labels):
+        # Times the block into histogram `name`; failures also bump `<name>_errors_total`
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(name.replace('_duration_seconds', '') + '_errors_total', **labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(name, elapsed, **labels)
+            if span:
+                self.add_span(span, elapsed)
+
+    # Per-request breakdown, kept per thread
+
+    def begin_request(self):
+        self._local.spans = {}
+
+    def add_span(self, component, seconds):
+        spans = getattr(self._local, 'spans', None)
+        if spans is not None:
+            spans[component] = spans.get(component, 0.0) + seconds
+
+    def end_request(self):
+        spans = getattr(self._local, 'spans', None) or {}
+        self._local.spans = None
+        return spans
+
+    def render(self):
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {key: list(state) for key, state in series.items()} for name, series in self._histograms.items()}
+
+        lines = []
+        for name in sorted(counters):
+            lines += self._header(name)
+            for key, value in sorted(counters[name].items()):
+                lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+        for name in sorted(histograms):
+            lines += self._header(name)
+            for key, state in sorted(histograms[name].items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f'{name}_bucket{_format_labels(key + (("le", repr(float(bound))),))} {count}')
+                lines.append(f'{name}_bucket{_format_labels(key + (("le", "+Inf"),))} {state[-1]}')
+                lines.append(f'{name}_sum{_format_labels(key)} {_format_value(state[-2])}')
+                lines.append(f'{name}_count{_format_labels(key)} {state[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, name):
+        lines = []
+        if name in self._help:
+            lines.append(f'# HELP {name} {self._help[name]}')
+        lines.append(f'# TYPE {name} {self._types.get(name, "untyped")}')
+        return lines
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every Mongo command; pass it to MongoClient(event_listeners=[...])."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        self.metrics.observe('mongo_command_duration_seconds', seconds, command=event.command_name)
+        # Listeners run on the thread that issued the command, so this lands on the right request
+        self.metrics.add_span('mongo', seconds)
+
+    def failed(self, event):
+        seconds = event.duration_micros / 1e6
+        self.metrics.observe('mongo_command_duration_seconds', seconds, command=event.command_name)
+        self.metrics.inc('mongo_command_errors_total', command=event.command_name)
+        self.metrics.add_span('mongo', seconds)
@@ -0,0 +1,168 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+LATENCY_WINDOW = 50  # Recent calls per model used to rank candidates
+MIN_SAMPLES = 5  # Until a model has this many, its latency budget stands in for its p50
+UNHEALTHY_ERROR_RATE = 0.5
+
+
+class NoModelAvailable(Exception):
+    pass
+
+
+class ModelRoute:
+    def __init__(self, models, budget, timeout=60):
+        self.models = list(models)  # Candidates, preferred first
+        self.budget = budget  # Seconds to wait on a call before hedging with the next candidate
+        self.timeout = timeout  # Overall deadline for the task, hedges and fallbacks included
+
+
+class ModelRouter:
+    """Per-task LLM model selection on top of the upstream gateway.
+
+    Each task has an ordered list of candidate models and a latency budget.
+    Candidates are ranked by rolling p50 latency, and models failing more
+    than half their recent calls drop to the back. A call that exceeds the
+    budget is hedged with the next candidate and the first answer wins. A
+    call that fails, or whose answer the caller's validate() rejects, falls
+    back to the next candidate straight away.
+    """
+
+    def __init__(self, gateway, routes, window=LATENCY_WINDOW):
+        self.gateway = gateway
+        self.routes = dict(routes)  # task -> ModelRoute
+        self.window = window
+        self._latencies = {}  # model -> deque of recent latencies (seconds)
+        self._outcomes = {}  # model -> deque of recent successes (True) / failures (False)
+        self._counters = collections.Counter()  # (task, event) -> count
+        self._lock = threading.Lock()
+
+    def chat(self, task, validate=None, **completion_args):
+        # validate(response) raises to reject an answer (e.g. JSON cut off at max_tokens); rejects count as failures
+        route = self.routes[task]
+        candidates = collections.deque(self.ranked(task))
+        deadline = time.monotonic() + route.timeout
+        started = time.perf_counter()
+        pending = {}  # future -> (model, launched at)
+        last_error = None
+
+        def launch():
+            model = candidates.popleft()
+            pending[self.gateway.submit_chat(**{**completion_args, 'model': model})] = (model, time.monotonic())
+
+        launch()
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # With spare candidates, wake up at the budget to hedge; otherwise wait out the deadline
+                done, _ = concurrent.futures.wait(
+                    pending, timeout=min(route.budget, remaining) if candidates else remaining,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                if not done:
+                    if candidates:
+                        self._count(task, 'hedges')
+                        launch()
+                    continue
+                for future in done:
+                    model, launched = pending.pop(future)
+                    try:
+                        response = future.result()
+                        if validate:
+                            validate(response)
+                    except Exception as e:
+                        self._record(model, time.monotonic() - launched, ok=False)
+                        last_error = e
+                        continue
+                    self._record(model, time.monotonic() - launched, ok=True)
+                    self._count(task, f'served_by:{model}')
+                    return response
+                if not pending and candidates:
+                    self._count(task, 'fallbacks')
+                    launch()
+        finally:
+            # Losing or abandoned calls still tell us the model was at least this slow
+            for future, (model, launched) in pending.items():
+                future.cancel()
+                self._record(model, time.monotonic() - launched, ok=None)
+            if self.gateway.metrics:
+                self.gateway.metrics.add_span('llm', time.perf_counter() - started)
+
+        self._count(task, 'failures')
+        if last_error is not None:
+            raise last_error
+        raise NoModelAvailable(f'No model answered {task} within {route.timeout}s')
+
+    def stream_chat(self, task, **completion_args):
+        # Streams can't be raced, but a model that fails before its first chunk falls back to the next one
+        route = self.routes[task]
+        last_error = None
+        for n, model in enumerate(self.ranked(task)):
+            if n:
+                self._count(task, 'fallbacks')
+            launched = time.monotonic()
+            chunks = self.gateway.stream_chat(timeout=route.timeout, **{**completion_args, 'model': model})
+            try:
+                first = next(chunks)
+            except StopIteration:
+                self._record(model, time.monotonic() - launched, ok=True)
+                return
+            except Exception as e:
+                self._record(model, time.monotonic() - launched, ok=False)
+                last_error = e
+                continue
+            self._record(model, time.monotonic() - launched, ok=True)  # Time to first chunk
+            self._count(task, f'served_by:{model}')
+            yield first
+            yield from chunks
+            return
+        self._count(task, 'failures')
+        raise last_error or NoModelAvailable(f'No model answered {task}')
+
+    def ranked(self, task):
+        route = self.routes[task]
+        with self._lock:
+            def sort_key(model):
+                latencies = sorted(self._latencies.get(model, ()))
+                outcomes = [ok for ok in self._outcomes.get(model, ()) if ok is not None]
+                unhealthy = len(outcomes) >= MIN_SAMPLES and outcomes.count(False) / len(outcomes) > UNHEALTHY_ERROR_RATE
+                p50 = latencies[len(latencies) // 2] if len(latencies) >= MIN_SAMPLES else route.budget
+                return (unhealthy, p50)
+            return sorted(route.models, key=sort_key)  # Stable, so ties keep the configured order
+
+    def stats(self):
+        with self._lock:
+            models = {}
+            for model in self._outcomes:
+                latencies = sorted(self._latencies.get(model, ()))
+                outcomes = list(self._outcomes.get(model, ()))
+                models[model] = {
+                    'samples': len(latencies),
+                    'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                    'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1) if latencies else None,
+                    'errors': outcomes.count(False),
+                    'abandoned': outcomes.count(None)
+                }
+            tasks = {}
+            for (task, event), count in self._counters.items():
+                tasks.setdefault(task, {})[event] = count
+        for task in self.routes:
+            tasks.setdefault(task, {})['ranking'] = self.ranked(task)
+        return {'models': models, 'tasks': tasks}
+
+    def _record(self, model, seconds, ok):
+        # ok=None marks a call we stopped waiting for; fast failures must not make a model look quick
+        with self._lock:
+            if ok is not False:
+                self._latencies.setdefault(model, collections.deque(maxlen=self.window)).append(seconds)
+            self._outcomes.setdefault(model, collections.deque(maxlen=self.window)).append(ok)
+
+    def _count(self, task, event):
+        with self._lock:
+            self._counters[(task, event)] += 1
+        if self.gateway.metrics and not event.startswith('served_by:'):
+            self.gateway.metrics.inc('llm_router_events_total', task=task, event=event)
@@ -0,0 +1,170 @@
+import datetime
+import hashlib
+import json
+import logging
+import threading
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from timeutil import utcnow
+
+# How many distinct custom-recipe option sets to keep warm per user
+MAX_WARM_OPTION_SETS = 3
+# Only suggestions the user actually asked for within this window are regenerated in the background
+WARM_WINDOW = 3 * 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(payload):
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+# Order-independent fingerprint of the (item_name, expiry_date) pairs a recipe is built from
+def inventory_fingerprint(ingredients):
+    return _hash(sorted([str(item['item_name']), str(item['expiry_date'])] for item in ingredients))
+
+
+def options_fingerprint(options):
+    options = dict(options or {})
+    if options.get('dietary_restrictions'):
+        options['dietary_restrictions'] = sorted(options['dietary_restrictions'])
+    return _hash(options)
+
+
+class RecipeSuggestionCache:
+    """Recipe suggestions keyed by (user, kind, inventory fingerprint, options).
+
+    When a user's inventory changes, suggestions for the old fingerprint are
+    dropped and new ones are generated on a small background pool. Only the
+    kinds and custom option sets the user requested in the last few days are
+    regenerated, so users who never open the Recipes page cost nothing, and
+    every background completion has to get past the acquire() budget. A
+    suggestion built from only the K items closest to expiry is stored with
+    max_ingredients=K and regenerated from the same K items. A
+    repeat visit to the Recipes page is then a single Mongo lookup. Changes
+    are debounced, so a burst of adds triggers one refresh.
+    """
+
+    def __init__(self, collection, executor, generate, load_ingredients, debounce=5.0, acquire=None):
+        self.collection = collection
+        self.executor = executor
+        self.generate = generate  # generate(kind, ingredients, options) -> recipe dict
+        self.load_ingredients = load_ingredients  # load_ingredients(username, max_ingredients) -> [{'item_name', 'expiry_date'}]
+        self.acquire = acquire  # acquire(username) -> ticket with release(); raises when the user is over budget
+        self.debounce = debounce
+        self._timers = {}
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def ensure_indexes(self):
+        self.collection.create_index(
+            [('username', ASCENDING), ('kind', ASCENDING), ('fingerprint', ASCENDING), ('options_fingerprint', ASCENDING)],
+            unique=True
+        )
+        # Suggestions nobody comes back for shouldn't live forever
+        self.collection.create_index('created_at', expireAfterSeconds=7 * 24 * 3600)
+
+    def get(self, username, kind, fingerprint, options=None, touch=True):
+        # touch marks the suggestion as requested, which keeps it on the warm list
+        query = {
+            'username': username, 'kind': kind,
+            'fingerprint': fingerprint, 'options_fingerprint': options_fingerprint(options)
+        }
+        try:
+            if touch:
+                doc = self.collection.find_one_and_update(query, {'$set': {'requested_at': utcnow()}}, projection={'recipe': 1})
+            else:
+                doc = self.collection.find_one(query, {'recipe': 1})
+        except PyMongoError:
+            return None
+        return doc['recipe'] if doc else None
+
+    def put(self, username, kind, fingerprint, recipe, options=None, requested_at=None, max_ingredients=None):
+        # requested_at defaults to now; background refreshes pass on the old one so they don't extend the window
+        options_key = options_fingerprint(options)
+        now = utcnow()
+        try:
+            self.collection.replace_one(
+                {'username': username, 'kind': kind, 'fingerprint': fingerprint, 'options_fingerprint': options_key},
+                {
+                    'username': username, 'kind': kind, 'fingerprint': fingerprint,
+                    'options_fingerprint': options_key, 'options': options or {}, 'max_ingredients': max_ingredients,
+                    'recipe': recipe, 'created_at': now, 'requested_at': requested_at or now
+                },
+                upsert=True
+            )
+        except PyMongoError:
+            pass
+
+    # Called whenever a user's inventory changes
+    def invalidate(self, username):
+        with self._lock:
+            timer = self._timers.pop(username, None)
+            if timer:
+                timer.cancel()
+            timer = threading.Timer(self.debounce, self._schedule_refresh, args=(username,))
+            timer.daemon = True
+            self._timers[username] = timer
+        timer.start()
+
+    def _schedule_refresh(self, username):
+        with self._lock:
+            self._timers.pop(username, None)
+        self.executor.submit(self._refresh, username)
+
+    def _refresh(self, username):
+        try:
+            self._rebuild(username)
+        except Exception as e:
+            logger.warning('Failed to refresh recipe suggestions for %s: %s', username, e)
+
+    def _rebuild(self, username):
+        # Remember what the user recently asked for before dropping the stale entries
+        wanted, seen, custom_sets = [], set(), 0
+        recent = self.collection.find(
+            {'username': username, 'requested_at': {'$gte': utcnow() - datetime.timedelta(seconds=WARM_WINDOW)}},
+            {'kind': 1, 'options': 1, 'options_fingerprint': 1, 'max_ingredients': 1, 'requested_at': 1}
+        ).sort('requested_at', DESCENDING)
+        for doc in recent:
+            key = (doc['kind'], doc['options_fingerprint'], doc.get('max_ingredients'))
+            if key in seen:
+                continue
+            if doc['kind'] == 'custom':
+                if custom_sets >= MAX_WARM_OPTION_SETS:
+                    continue
+                custom_sets += 1
+            seen.add(key)
+            wanted.append((doc['kind'], doc.get('options') or None, doc.get('max_ingredients'), doc['requested_at']))
+
+        # The full inventory plus each subset size asked for; suggestions built from anything else are stale
+        ingredient_sets = {None: self.load_ingredients(username, None)}
+        for _, _, max_ingredients, _ in wanted:
+            if max_ingredients not in ingredient_sets:
+                ingredient_sets[max_ingredients] = self.load_ingredients(username, max_ingredients)
+        fingerprints = {limit: inventory_fingerprint(ingredients) for limit, ingredients in ingredient_sets.items()}
+        self.collection.delete_many({'username': username, 'fingerprint': {'$nin': list(set(fingerprints.values()))}})
+
+        for kind, options, max_ingredients, requested_at in wanted:
+            if ingredient_sets[max_ingredients]:
+                self._warm(username, kind, ingredient_sets[max_ingredients], fingerprints[max_ingredients], options, requested_at, max_ingredients)
+
+    def _warm(self, username, kind, ingredients, fingerprint, options, requested_at, max_ingredients=None):
+        key = (username, kind, fingerprint, options_fingerprint(options))
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+        ticket = None
+        try:
+            if self.get(username, kind, fingerprint, options, touch=False) is None:
+                ticket = self.acquire(username) if self.acquire else None
+                self.put(username, kind, fingerprint, self.generate(kind, ingredients, options), options, requested_at, max_ingredients)
+        except Exception as e:
+            logger.warning('Failed to precompute %s suggestion for %s: %s', kind, username, e)
+        finally:
+            if ticket:
+                ticket.release()
+            with self._lock:
+                self._inflight.discard(key)
@@ -0,0 +1,6 @@
+# From backend/: pip install -r tests/requirements.txt && python -m pytest tests
+import os
+import sys
+
+# The backend modules import each other as top-level modules, the same way app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
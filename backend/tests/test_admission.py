@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionClass, AdmissionController, AdmissionRejected
+
+
+def controller(**spec):
+    defaults = dict(rate=1000, burst=1000, concurrency=1, max_queue=10, max_queue_per_user=5, queue_timeout=5)
+    return AdmissionController({'llm': AdmissionClass(**{**defaults, **spec})})
+
+
+def wait_for_queued(admission, count):
+    deadline = time.monotonic() + 2
+    while admission.stats()['llm']['queued'] < count:
+        assert time.monotonic() < deadline, 'waiter never queued'
+        time.sleep(0.005)
+
+
+def test_rate_limited_once_bucket_is_empty():
+    admission = controller(rate=1, burst=1, concurrency=5)
+    admission.acquire('llm', 'alice').release()
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire('llm', 'alice')
+    assert excinfo.value.reason == 'rate_limited'
+    assert 0 < excinfo.value.retry_after <= 1
+    # Buckets are per user
+    admission.acquire('llm', 'bob').release()
+    assert admission.stats()['llm']['rejected']['rate_limited'] == 1
+
+
+def test_queue_full_when_no_room_to_wait():
+    admission = controller(max_queue=0)
+    ticket = admission.acquire('llm', 'alice')
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire('llm', 'bob')
+    assert excinfo.value.reason == 'queue_full'
+    assert excinfo.value.retry_after >= 1
+    ticket.release()
+    admission.acquire('llm', 'bob').release()
+
+
+def test_queue_full_per_user():
+    admission = controller(max_queue_per_user=1, queue_timeout=2)
+    ticket = admission.acquire('llm', 'alice')
+    waiter = threading.Thread(target=lambda: admission.acquire('llm', 'alice').release())
+    waiter.start()
+    wait_for_queued(admission, 1)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire('llm', 'alice')
+    assert excinfo.value.reason == 'queue_full'
+    ticket.release()
+    waiter.join()
+
+
+def test_queue_timeout_leaves_the_queue():
+    admission = controller(queue_timeout=0.05)
+    ticket = admission.acquire('llm', 'alice')
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire('llm', 'bob')
+    assert excinfo.value.reason == 'queue_timeout'
+    stats = admission.stats()['llm']
+    assert stats['queued'] == 0 and stats['queued_users'] == 0
+    # The slot goes back to the pool rather than to the waiter that gave up
+    ticket.release()
+    assert admission.stats()['llm']['in_flight'] == 0
+
+
+def test_release_serves_queued_users_round_robin():
+    admission = controller()
+    order, lock = [], threading.Lock()
+
+    def request(user):
+        ticket = admission.acquire('llm', user)
+        with lock:
+            order.append(user)
+        ticket.release()
+
+    ticket = admission.acquire('llm', 'hog')
+    threads = []
+    for n, user in enumerate(['hog', 'hog', 'a', 'b']):
+        thread = threading.Thread(target=request, args=(user,))
+        thread.start()
+        threads.append(thread)
+        wait_for_queued(admission, n + 1)
+
+    ticket.release()
+    for thread in threads:
+        thread.join(2)
+    # FIFO would give hog, hog, a, b
+    assert order == ['hog', 'a', 'b', 'hog']
+    stats = admission.stats()['llm']
+    assert stats['in_flight'] == 0 and stats['admitted'] == 5
+
+
+def test_release_is_idempotent():
+    admission = controller(concurrency=2)
+    ticket = admission.acquire('llm', 'alice')
+    ticket.release()
+    ticket.release()
+    assert admission.stats()['llm']['in_flight'] == 0
+
+
+def test_one_user_cannot_saturate_a_class():
+    admission = controller(concurrency=3, max_in_flight_per_user=2, queue_timeout=0.05)
+    tickets = [admission.acquire('llm', 'hog') for _ in range(2)]
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire('llm', 'hog')
+    assert excinfo.value.reason == 'user_limit'
+    # The slot the hog couldn't take is still there for someone else
+    admission.acquire('llm', 'alice').release()
+    tickets.pop().release()
+    tickets.append(admission.acquire('llm', 'hog'))
+    stats = admission.stats()['llm']
+    assert stats['rejected']['user_limit'] == 1 and stats['in_flight'] == 2
+
+
+def test_queued_requests_count_against_the_user_limit():
+    admission = controller(max_in_flight_per_user=2, queue_timeout=2)
+    ticket = admission.acquire('llm', 'hog')
+    waiter = threading.Thread(target=lambda: admission.acquire('llm', 'hog').release())
+    waiter.start()
+    wait_for_queued(admission, 1)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire('llm', 'hog')
+    assert excinfo.value.reason == 'user_limit'
+    ticket.release()
+    waiter.join()
+
+
+def test_capacity_and_per_user_limit_span_classes():
+    spec = dict(rate=1000, burst=1000, concurrency=2, max_queue=2, queue_timeout=0.05)
+    admission = AdmissionController({'llm': AdmissionClass(**spec), 'barcode': AdmissionClass(**spec)}, capacity=3, max_per_user=2)
+    held = [admission.acquire('llm', 'hog'), admission.acquire('barcode', 'hog')]
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire('barcode', 'hog')
+    assert excinfo.value.reason == 'user_limit'
+    held.append(admission.acquire('llm', 'alice'))
+    # Every thread we may hold is taken, so a new request is turned away rather than queued
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire('barcode', 'bob')
+    assert excinfo.value.reason == 'queue_full'
+    for ticket in held:
+        ticket.release()
+    admission.acquire('barcode', 'bob').release()
+    assert all(stats['in_flight'] == 0 and stats['queued'] == 0 for stats in admission.stats().values())
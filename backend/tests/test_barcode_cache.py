@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import mongomock
+import pytest
+
+from barcode_cache import BarcodeCache
+from catalog import ProductCatalog
+
+TEA = {'name': 'Green Tea', 'image': None}
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def fetched():
+    return []
+
+
+def make_cache(db, fetched, catalog=None):
+    def fetch(barcode):
+        fetched.append(barcode)
+        return None
+    return BarcodeCache(fetch, collection=db.barcode_cache, recheck=catalog.get if catalog else None)
+
+
+def test_not_found_is_cached(db, fetched):
+    cache = make_cache(db, fetched)
+    assert cache.lookup('0001') is None
+    assert cache.lookup('0001') is None
+    # A second worker shares the Mongo entry
+    assert make_cache(db, fetched).lookup('0001') is None
+    assert fetched == ['0001']
+    assert cache.stats()['negative_hits'] == 1
+
+
+def test_imported_products_override_cached_not_found(db, fetched):
+    catalog = ProductCatalog(db.products)
+    cache = make_cache(db, fetched, catalog)
+    other_worker = make_cache(db, fetched, catalog)
+    assert cache.lookup('0001') is None
+    assert other_worker.lookup('0001') is None
+
+    catalog.put('0001', TEA, source='import')
+    assert cache.lookup('0001') == TEA
+    assert other_worker.lookup('0001') == TEA
+    assert fetched == ['0001']
+    assert cache.stats()['rechecked'] == 1
+    # The cached answer is now the product, so the catalog isn't asked again
+    assert cache.lookup('0001') == TEA
+    assert cache.stats()['rechecked'] == 1
+
+
+def test_lookup_many_rechecks_cached_not_found(db, fetched):
+    catalog = ProductCatalog(db.products)
+    cache = make_cache(db, fetched, catalog)
+    with ThreadPoolExecutor(2) as executor:
+        assert cache.lookup_many(['0001', '0002', '0003'], executor) == ({'0001': None, '0002': None, '0003': None}, {})
+        for barcode in ('0002', '0003'):
+            catalog.put(barcode, TEA, source='import')
+        # From memory here, from Mongo in a worker that hasn't seen the barcode yet
+        assert cache.lookup_many(['0001', '0002'], executor) == ({'0001': None, '0002': TEA}, {})
+        assert make_cache(db, fetched, catalog).lookup_many(['0003'], executor) == ({'0003': TEA}, {})
+    assert sorted(fetched) == ['0001', '0002', '0003']
@@ -0,0 +1,160 @@
+import datetime
+
+import mongomock
+import pytest
+
+from inventory import (
+    InvalidQuery, decode_cursor, encode_cursor, ensure_inventory_indexes, format_expiry_date, insert_items,
+    list_inventory_page, parse_expiry_date, parse_within
+)
+
+
+@pytest.fixture
+def items():
+    return mongomock.MongoClient().db.items
+
+
+def list_all(items, sort, limit, **kwargs):
+    pages, cursor = [], None
+    while True:
+        page, cursor = list_inventory_page(items, 'alice', sort=sort, cursor=cursor, limit=limit, **kwargs)
+        pages.append([item['item_name'] for item in page])
+        if not cursor:
+            return pages
+
+
+def test_pages_by_id(items):
+    items.insert_many([{'username': 'alice', 'item_name': f'item {n}', 'expiry_date': '2030-10-01'} for n in range(5)])
+    items.insert_one({'username': 'bob', 'item_name': 'not yours', 'expiry_date': '2030-10-01'})
+    assert list_all(items, '_id', 2) == [['item 0', 'item 1'], ['item 2', 'item 3'], ['item 4']]
+
+
+def test_no_cursor_when_the_last_page_is_exactly_full(items):
+    items.insert_many([{'username': 'alice', 'item_name': f'item {n}', 'expiry_date': '2030-10-01'} for n in range(4)])
+    assert list_all(items, '_id', 2) == [['item 0', 'item 1'], ['item 2', 'item 3']]
+
+
+def test_pages_by_expiry_break_ties_on_id(items):
+    dates = ['2030-10-03', '2030-10-01', '2030-10-02', '2030-10-01', '2030-10-01']
+    items.insert_many([{'username': 'alice', 'item_name': f'item {n}', 'expiry_date': date} for n, date in enumerate(dates)])
+    assert list_all(items, 'expiry_date', 2) == [['item 1', 'item 3'], ['item 4', 'item 2'], ['item 0']]
+
+
+def test_projection(items):
+    items.insert_one({'username': 'alice', 'item_name': 'Milk', 'expiry_date': '2030-10-01', 'image': 'x', 'barcode': '1'})
+    page, _ = list_inventory_page(items, 'alice', fields='item_name')
+    assert set(page[0]) == {'_id', 'item_name'}
+    # The expiry sort needs the date for its cursor
+    page, _ = list_inventory_page(items, 'alice', sort='expiry_date', fields='item_name')
+    assert set(page[0]) == {'_id', 'item_name', 'expiry_date'}
+    with pytest.raises(InvalidQuery):
+        list_inventory_page(items, 'alice', fields='item_name,password')
+
+
+def test_pages_by_expiry_across_strings_and_datetimes(items):
+    # Half-migrated inventory: BSON sorts every string before every date
+    dates = [datetime.datetime(2030, 10, 2), '2030-10-09', datetime.datetime(2030, 10, 1), '2030-10-05', datetime.datetime(2030, 10, 1), '2030-10-05']
+    items.insert_many([{'username': 'alice', 'item_name': f'item {n}', 'expiry_date': date} for n, date in enumerate(dates)])
+    for limit in (1, 2, 4):
+        pages = list_all(items, 'expiry_date', limit)
+        assert sum(pages, []) == ['item 3', 'item 5', 'item 1', 'item 2', 'item 4', 'item 0']
+
+
+def test_expiry_cursor_keeps_the_value_type():
+    item_id = '5f5f5f5f5f5f5f5f5f5f5f5f'
+    as_date = decode_cursor('expiry_date', encode_cursor('expiry_date', {'_id': item_id, 'expiry_date': datetime.datetime(2030, 10, 1, 12)}))
+    assert as_date['$or'][0] == {'expiry_date': {'$gt': datetime.datetime(2030, 10, 1, 12)}}
+    assert len(as_date['$or']) == 2
+    # A string cursor must also let every date through
+    as_string = decode_cursor('expiry_date', encode_cursor('expiry_date', {'_id': item_id, 'expiry_date': '2030-10-01T12:00:00'}))
+    assert as_string['$or'][0] == {'expiry_date': {'$gt': '2030-10-01T12:00:00'}}
+    assert as_string['$or'][2] == {'expiry_date': {'$type': 'date'}}
+
+
+@pytest.mark.parametrize('sort, cursor', [
+    ('_id', 'garbage'),
+    ('_id', 'e30='),  # {}
+    ('expiry_date', encode_cursor('_id', {'_id': '5f5f5f5f5f5f5f5f5f5f5f5f'})),  # No expiry in it
+    ('item_name', None)
+])
+def test_invalid_cursor_or_sort(items, sort, cursor):
+    with pytest.raises(InvalidQuery):
+        list_inventory_page(items, 'alice', sort=sort, cursor=cursor)
+
+
+def new_items(*keys, username='alice'):
+    return [{'username': username, 'item_name': f'item {n}', **({'idempotency_key': key} if key else {})} for n, key in enumerate(keys)]
+
+
+def test_insert_items_reports_each_document(items):
+    ensure_inventory_indexes(items)
+    outcomes = insert_items(items, 'alice', new_items('req:0', None, 'req:2'))
+    assert [status for status, _ in outcomes] == ['created'] * 3
+    assert [detail for _, detail in outcomes] == [item['_id'] for item in items.find().sort('_id', 1)]
+
+
+def test_retried_bulk_insert_is_a_no_op(items):
+    ensure_inventory_indexes(items)
+    first = insert_items(items, 'alice', new_items('req:0', 'req:1'))
+    # The retry points at the items the first attempt created
+    assert insert_items(items, 'alice', new_items('req:0', 'req:1')) == [('duplicate', _id) for _, _id in first]
+    assert items.count_documents({}) == 2
+
+
+def test_partly_applied_bulk_insert_completes_on_retry(items):
+    ensure_inventory_indexes(items)
+    (_, first_id), = insert_items(items, 'alice', new_items('req:0'))
+    outcomes = insert_items(items, 'alice', new_items('req:0', 'req:1', None))
+    assert outcomes[0] == ('duplicate', first_id)
+    assert [status for status, _ in outcomes[1:]] == ['created', 'created']
+    assert items.count_documents({}) == 3
+
+
+def test_idempotency_keys_are_per_user_and_optional(items):
+    ensure_inventory_indexes(items)
+    insert_items(items, 'alice', new_items('req:0', None, None))
+    assert [status for status, _ in insert_items(items, 'bob', new_items('req:0', username='bob'))] == ['created']
+    # Items without a key never collide with each other
+    assert [status for status, _ in insert_items(items, 'alice', new_items(None, None))] == ['created', 'created']
+    assert items.count_documents({}) == 6
+
+
+def test_insert_items_with_nothing_to_insert(items):
+    assert insert_items(items, 'alice', []) == []
+
+
+@pytest.mark.parametrize('value', [
+    '2030-10-05', '2030-10-05T00:00:00', '10/05/2030', '10/05/30', '5 October 2030', 'October 5, 2030',
+    '  2030-10-05  ', datetime.date(2030, 10, 5), datetime.datetime(2030, 10, 5)
+])
+def test_parse_expiry_date_formats(value):
+    assert parse_expiry_date(value) == datetime.datetime(2030, 10, 5)
+
+
+def test_parse_expiry_date_converts_to_naive_utc():
+    assert parse_expiry_date('2030-10-05T02:00:00+05:00') == datetime.datetime(2030, 10, 4, 21)
+    assert parse_expiry_date('2030-10-05T02:00:00Z') == datetime.datetime(2030, 10, 5, 2)
+    aware = datetime.datetime(2030, 10, 5, 2, tzinfo=datetime.timezone(datetime.timedelta(hours=-3)))
+    assert parse_expiry_date(aware) == datetime.datetime(2030, 10, 5, 5)
+
+
+@pytest.mark.parametrize('value', [None, '', '   ', 'soon', '2030-13-01', '31/12/2030', 20301005, ['2030-10-05']])
+def test_parse_expiry_date_unreadable(value):
+    assert parse_expiry_date(value) is None
+
+
+def test_format_expiry_date_round_trips():
+    assert format_expiry_date(parse_expiry_date('10/05/2030')) == '2030-10-05'
+    # Values stored before dates were parsed go back out untouched
+    assert format_expiry_date('next week') == 'next week'
+
+
+@pytest.mark.parametrize('value, days', [('7', 7), ('7d', 7), ('2w', 14), (' 3 d ', 3), ('0', 0)])
+def test_parse_within(value, days):
+    assert parse_within(value) == datetime.timedelta(days=days)
+
+
+@pytest.mark.parametrize('value', [None, '', 'week', '-1d', '2m', '1.5w'])
+def test_parse_within_rejects(value):
+    with pytest.raises(InvalidQuery):
+        parse_within(value)
@@ -0,0 +1,75 @@
+import mongomock
+import pytest
+from bson import ObjectId
+
+import inventory_changes
+from inventory_changes import ChangeLogGap, InventoryChangeLog
+
+
+@pytest.fixture
+def log():
+    db = mongomock.MongoClient().db
+    change_log = InventoryChangeLog(db.inventory_versions, db.inventory_changes)
+    change_log.ensure_indexes()
+    return change_log
+
+
+def test_versions_start_at_zero_and_count_up(log):
+    assert log.version('alice') == 0
+    assert log.record('alice', inserted_ids=[ObjectId()]) == 1
+    assert log.record('alice', inserted_ids=[ObjectId()]) == 2
+    assert log.version('alice') == 2
+    assert log.version('bob') == 0
+
+
+def test_changes_are_netted(log):
+    kept, removed, old = ObjectId(), ObjectId(), ObjectId()
+    log.record('alice', inserted_ids=[old])
+    log.record('alice', inserted_ids=[kept, removed])
+    log.record('alice', deleted_ids=[removed, old])
+
+    version, inserted, deleted = log.changes_since('alice', 1)
+    assert version == 3
+    assert inserted == [kept]
+    assert sorted(deleted) == sorted([removed, old])
+
+
+def test_up_to_date_client_gets_nothing(log):
+    log.record('alice', inserted_ids=[ObjectId()])
+    assert log.changes_since('alice', 1) == (1, [], [])
+
+
+def test_since_ahead_of_current_is_rejected(log):
+    with pytest.raises(ValueError):
+        log.changes_since('alice', 1)
+
+
+def test_bump_without_changes_is_a_gap(log):
+    log.record('alice', inserted_ids=[ObjectId()])
+    log.record('alice')  # e.g. a migration
+    with pytest.raises(ChangeLogGap):
+        log.changes_since('alice', 0)
+    # Clients that already had the bump carry on
+    item_id = ObjectId()
+    log.record('alice', inserted_ids=[item_id])
+    assert log.changes_since('alice', 2) == (3, [item_id], [])
+
+
+def test_expired_entries_are_a_gap(log):
+    for _ in range(3):
+        log.record('alice', inserted_ids=[ObjectId()])
+    log.changes.delete_many({'version': 1})  # What the TTL index does to old entries
+    with pytest.raises(ChangeLogGap):
+        log.changes_since('alice', 0)
+    assert log.changes_since('alice', 1)[0] == 3
+
+
+def test_too_many_changes_is_a_gap(log, monkeypatch):
+    monkeypatch.setattr(inventory_changes, 'MAX_CHANGES', 3)
+    log.record('alice', inserted_ids=[ObjectId() for _ in range(4)])
+    with pytest.raises(ChangeLogGap):
+        log.changes_since('alice', 0)
+    for _ in range(4):
+        log.record('alice', inserted_ids=[ObjectId()])
+    with pytest.raises(ChangeLogGap):
+        log.changes_since('alice', 1)
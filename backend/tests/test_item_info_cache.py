@@ -0,0 +1,112 @@
+import datetime
+
+import mongomock
+import pytest
+
+import item_info_cache
+import ttl_cache
+from item_info_cache import ItemInfoCache, normalize_item_name, restrictions_fingerprint
+from ttl_cache import TTLCache
+
+TODAY = datetime.date(2030, 10, 1)
+
+
+class Clock:
+    def __init__(self):
+        self.monotonic = 1000.0
+        self.utc = datetime.datetime(2030, 10, 1, 12)
+
+    def advance(self, seconds):
+        self.monotonic += seconds
+        self.utc += datetime.timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache.time, 'monotonic', lambda: clock.monotonic)
+    monkeypatch.setattr(item_info_cache, 'utcnow', lambda: clock.utc)
+    return clock
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.item_info_cache
+
+
+def test_keys_ignore_case_punctuation_and_restriction_order():
+    assert normalize_item_name('Whole Milk, 1 gal') == normalize_item_name('whole  milk 1 GAL') == 'whole milk 1 gal'
+    assert restrictions_fingerprint(['Vegan', 'halal ', 'vegan']) == restrictions_fingerprint('halal,vegan')
+    assert restrictions_fingerprint(None) == restrictions_fingerprint([]) == restrictions_fingerprint([' '])
+    assert restrictions_fingerprint(['vegan']) != restrictions_fingerprint([])
+
+
+def test_ttl_cache_expiry_and_lru(clock):
+    cache = TTLCache(2)
+    cache.set('a', None, 10)
+    cache.set('b', 2, 100)
+    assert cache.get('a') == (True, None)
+    clock.advance(10)
+    assert cache.get('a') == (False, None)
+    cache.set('c', 3, 100)
+    cache.get('b')
+    cache.set('d', 4, 100)
+    # c was the least recently used
+    assert cache.get('c') == (False, None) and cache.get('b') == (True, 2)
+    assert cache.evictions == 1
+
+
+def test_shelf_life_is_kept_in_days(clock):
+    cache = ItemInfoCache()
+    answer = cache.put('Milk', ['vegan'], {'dietary_compatible': 'no', 'estimated_expiry_date': '2030-10-08'}, today=TODAY)
+    assert answer == {'dietary_compatible': 'no', 'estimated_expiry_date': '2030-10-08', 'shelf_life_days': 7}
+    # A week later the same answer still means "a week from today"
+    later = cache.get('milk', ['Vegan'], today=TODAY + datetime.timedelta(days=7))
+    assert later['estimated_expiry_date'] == '2030-10-15'
+    # Across a month and a year boundary
+    assert cache.get('milk', ['vegan'], today=datetime.date(2030, 12, 28))['estimated_expiry_date'] == '2031-01-04'
+
+
+@pytest.mark.parametrize('item_info, days', [
+    ({'dietary_compatible': 'yes', 'shelf_life_days': 3}, 3),
+    ({'dietary_compatible': 'yes', 'shelf_life_days': '5', 'estimated_expiry_date': '2031-01-01'}, 5),
+    ({'dietary_compatible': 'yes', 'estimated_expiry_date': '2030-10-01T18:00:00'}, 0),
+    ({'dietary_compatible': 'yes', 'estimated_expiry_date': '2030-09-20'}, 0),
+    ({'dietary_compatible': 'yes', 'shelf_life_days': -2}, 0),
+    ({'dietary_compatible': 'yes', 'estimated_expiry_date': '2032-02-29'}, 516)
+])
+def test_shelf_life_days(item_info, days):
+    assert ItemInfoCache().put('Rice', [], item_info, today=TODAY)['shelf_life_days'] == days
+
+
+@pytest.mark.parametrize('item_info', [
+    {'dietary_compatible': 'yes', 'estimated_expiry_date': 'next week'},
+    {'dietary_compatible': 'yes'},
+    {'dietary_compatible': 'maybe', 'shelf_life_days': 3}
+])
+def test_unusable_answers_are_not_cached(item_info):
+    cache = ItemInfoCache()
+    assert cache.put('Rice', [], item_info, today=TODAY) is None
+    assert cache.get('Rice', [], today=TODAY) is None
+
+
+def test_entries_expire(clock, collection):
+    cache = ItemInfoCache(collection, ttl=3600)
+    cache.put('Milk', [], {'dietary_compatible': 'yes', 'shelf_life_days': 7}, today=TODAY)
+    clock.advance(3599)
+    assert cache.get('Milk', [], today=TODAY) is not None
+    clock.advance(1)
+    assert cache.get('Milk', [], today=TODAY) is None
+    # Mongo's TTL monitor may not have run yet, so a fresh worker checks expires_at itself
+    assert ItemInfoCache(collection, ttl=3600).get('Milk', [], today=TODAY) is None
+
+
+def test_workers_share_answers_for_the_remaining_ttl(clock, collection):
+    ItemInfoCache(collection, ttl=3600).put('Milk', [], {'dietary_compatible': 'yes', 'shelf_life_days': 7}, today=TODAY)
+    clock.advance(3000)
+    other_worker = ItemInfoCache(collection, ttl=3600)
+    assert other_worker.get('milk', [], today=TODAY)['shelf_life_days'] == 7
+    clock.advance(600)
+    # The memory copy expires with the Mongo entry, not a full TTL after it was read
+    assert other_worker.get('milk', [], today=TODAY) is None
+    assert other_worker.stats() == {'memory_hits': 0, 'mongo_hits': 1, 'misses': 1, 'size': 0, 'evictions': 0}
@@ -0,0 +1,64 @@
+import mongomock
+import pytest
+
+from item_names import ItemNameCanonicalizer, edit_distance, item_name_key, ordered_item_name_key, tokenize_item_name
+
+
+@pytest.fixture
+def names():
+    return ItemNameCanonicalizer(mongomock.MongoClient().db.item_names)
+
+
+def test_tokenize_drops_sizes_noise_and_plurals():
+    assert tokenize_item_name('Chobani Greek Yogurt, 5.3 oz, 12 pack') == ['chobani', 'greek', 'yogurt']
+    assert tokenize_item_name('Strawberries & Cream 2x100ml') == ['strawberry', 'cream']
+    assert tokenize_item_name('Tomatoes') == ['tomato']
+
+
+def test_keys_differ_only_in_word_order():
+    assert item_name_key('Yogurt, Greek') == item_name_key('Greek Yogurt') == 'greek yogurt'
+    assert ordered_item_name_key('Milk Chocolate') == 'milk chocolate'
+    assert ordered_item_name_key('Chocolate Milk') == 'chocolate milk'
+
+
+def test_edit_distance():
+    assert edit_distance('yoghurt', 'yogurt', 2) == 1
+    assert edit_distance('mlik', 'milk', 2) == 1  # Neighbours swapped
+    assert edit_distance('salted', 'unsalted', 1) == 2  # Capped at limit + 1
+
+
+def test_misspelling_lands_on_known_product(names):
+    names.canonicalize('Greek Yogurt')
+    assert names.canonicalize('greek yoghurt')[0] == 'greek yogurt'
+    assert names.canonicalize('Parmesan Cheese')[0] == 'cheese parmesan'
+    assert names.canonicalize('parmesean cheese')[0] == 'cheese parmesan'
+
+
+@pytest.mark.parametrize('known, other', [
+    ('Green Tea', 'Green Peas'),
+    ('Salted Butter', 'Unsalted Butter'),
+    ('Unsalted Butter', 'Salted Butter'),
+    ('Pasta Sauce', 'Paste Sauce'),
+    ('Ham', 'Jam'),
+])
+def test_different_products_stay_apart(names, known, other):
+    known_key, _ = names.canonicalize(known)
+    other_key, other_tokens = names.canonicalize(other)
+    assert other_key != known_key
+    assert other_key == item_name_key(other)
+    assert set(other_tokens) == set(tokenize_item_name(other))
+
+
+def test_known_words_are_never_rewritten(names):
+    names.canonicalize('Butter')
+    names.canonicalize('Batter Mix')
+    assert names.canonicalize('batter')[0] == 'batter'
+
+
+def test_search_tokens(names):
+    names.canonicalize('Green Tea')
+    names.canonicalize('Green Peas')
+    names.canonicalize('Greek Yogurt')
+    # Prefixes of known words are left for prefix search; short tokens are never corrected
+    assert names.correct_tokens(['gre', 'tea', 'pea']) == ['gre', 'tea', 'pea']
+    assert names.correct_tokens(['yoghurt']) == ['yogurt']
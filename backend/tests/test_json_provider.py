@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from json_provider import iter_json_array, parse_json_completion, repair_json
+
+
+@pytest.mark.parametrize('content, expected', [
+    ('{"a": 1}', {'a': 1}),
+    ('{"a": [1, 2,],}', {'a': [1, 2]}),
+    ('Sure! ```json\n{"a": 1}\n``` Enjoy.', {'a': 1}),
+    ('{"a": 1} trailing {"b": 2}', {'a': 1}),
+    ('{"a": {"b": [1, 2', {'a': {'b': [1, 2]}}),
+    ('{"a": "cut of', {'a': 'cut of'}),
+    ('{"a": "say \\"hi\\" ', {'a': 'say "hi" '}),
+    ('{"a": 1, "b":', {'a': 1}),
+    ('{"a": 1, "b"', {'a': 1}),
+    ('{"a": 1,', {'a': 1}),
+    ('[1, 2, ', [1, 2]),
+    ('{"steps": ["chop", "stir"', {'steps': ['chop', 'stir']}),
+])
+def test_repair_json(content, expected):
+    assert json.loads(repair_json(content)) == expected
+
+
+def test_repair_json_without_json():
+    assert repair_json('no json here') is None
+    with pytest.raises(ValueError):
+        parse_json_completion('no json here')
+
+
+def test_parse_json_completion_only_repairs_when_needed():
+    assert parse_json_completion('{"a": [1, 2,]}') == {'a': [1, 2]}
+    assert parse_json_completion('[]') == []
+
+
+@pytest.mark.parametrize('count', [0, 1, 3, 7])
+def test_iter_json_array(count):
+    items = [{'n': n} for n in range(count)]
+    assert json.loads(b''.join(iter_json_array(items, chunk_size=3))) == items
@@ -0,0 +1,87 @@
+import concurrent.futures
+import time
+
+import pytest
+
+from model_router import ModelRoute, ModelRouter, NoModelAvailable
+
+
+class FakeGateway:
+    metrics = None
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour  # model -> (delay, answer or exception)
+        self.calls = []
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+
+    def submit_chat(self, model, **completion_args):
+        self.calls.append(model)
+        delay, outcome = self.behaviour[model]
+
+        def call():
+            time.sleep(delay)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return self.executor.submit(call)
+
+
+def router(behaviour, models=('primary', 'secondary'), budget=0.05, timeout=2):
+    return ModelRouter(FakeGateway(behaviour), {'task': ModelRoute(models, budget=budget, timeout=timeout)})
+
+
+def test_returns_primary_answer_within_budget():
+    llm = router({'primary': (0, 'p'), 'secondary': (0, 's')}, budget=1)
+    assert llm.chat('task', messages=[]) == 'p'
+    assert llm.gateway.calls == ['primary']
+
+
+def test_failure_falls_back_to_next_candidate():
+    llm = router({'primary': (0, RuntimeError('down')), 'secondary': (0, 's')}, budget=1)
+    assert llm.chat('task', messages=[]) == 's'
+    assert llm.gateway.calls == ['primary', 'secondary']
+    assert llm.stats()['tasks']['task']['fallbacks'] == 1
+    assert llm.stats()['models']['primary']['errors'] == 1
+
+
+def test_slow_call_is_hedged_and_first_answer_wins():
+    llm = router({'primary': (1, 'p'), 'secondary': (0, 's')}, budget=0.05)
+    started = time.monotonic()
+    assert llm.chat('task', messages=[]) == 's'
+    assert time.monotonic() - started < 0.5
+    assert llm.stats()['tasks']['task']['hedges'] == 1
+    # The loser is abandoned, not counted as an error
+    primary = llm.stats()['models']['primary']
+    assert primary['errors'] == 0 and primary['abandoned'] == 1
+
+
+def test_rejected_answer_falls_back():
+    def validate(response):
+        if response == 'truncated':
+            raise ValueError('cut off')
+
+    llm = router({'primary': (0, 'truncated'), 'secondary': (0, 's')}, budget=1)
+    assert llm.chat('task', validate=validate, messages=[]) == 's'
+    assert llm.stats()['models']['primary']['errors'] == 1
+
+
+def test_deadline_without_answer_raises():
+    llm = router({'primary': (1, 'p'), 'secondary': (1, 's')}, budget=0.02, timeout=0.1)
+    started = time.monotonic()
+    with pytest.raises(NoModelAvailable):
+        llm.chat('task', messages=[])
+    assert time.monotonic() - started < 0.5
+    assert llm.stats()['tasks']['task']['failures'] == 1
+
+
+def test_all_candidates_failing_raises_last_error():
+    llm = router({'primary': (0, RuntimeError('first')), 'secondary': (0, RuntimeError('second'))}, budget=1)
+    with pytest.raises(RuntimeError, match='second'):
+        llm.chat('task', messages=[])
+
+
+def test_unhealthy_model_drops_to_the_back():
+    llm = router({'primary': (0, RuntimeError('down')), 'secondary': (0, 's')}, budget=1)
+    for _ in range(5):
+        llm.chat('task', messages=[])
+    assert llm.ranked('task') == ['secondary', 'primary']
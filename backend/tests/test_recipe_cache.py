@@ -0,0 +1,80 @@
+import mongomock
+import pytest
+
+from recipe_cache import RecipeSuggestionCache, inventory_fingerprint, options_fingerprint
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@pytest.fixture
+def inventory():
+    return {'alice': [
+        {'item_name': 'Milk', 'expiry_date': '2030-10-02'},
+        {'item_name': 'Bread', 'expiry_date': '2030-10-01'},
+        {'item_name': 'Rice', 'expiry_date': '2031-06-01'}
+    ]}
+
+
+@pytest.fixture
+def cache(inventory):
+    def load_ingredients(username, max_ingredients):
+        items = sorted(inventory[username], key=lambda item: item['expiry_date'])
+        return items[:max_ingredients] if max_ingredients else items
+
+    def generate(kind, ingredients, options):
+        cache.generated.append((kind, [item['item_name'] for item in ingredients]))
+        return {'recipe_name': f'{kind} #{len(cache.generated)}'}
+
+    cache = RecipeSuggestionCache(mongomock.MongoClient().db.recipe_suggestions, InlineExecutor(), generate, load_ingredients)
+    cache.generated = []
+    cache.ensure_indexes()
+    return cache
+
+
+def test_fingerprints_ignore_order():
+    items = [{'item_name': 'Milk', 'expiry_date': '2030-10-02'}, {'item_name': 'Bread', 'expiry_date': '2030-10-01'}]
+    assert inventory_fingerprint(items) == inventory_fingerprint(items[::-1])
+    assert options_fingerprint({'dietary_restrictions': ['vegan', 'halal']}) == options_fingerprint({'dietary_restrictions': ['halal', 'vegan']})
+
+
+def test_only_requested_suggestions_are_warmed(cache, inventory):
+    cache.put('alice', 'recipe', inventory_fingerprint(inventory['alice']), {'recipe_name': 'old'})
+    inventory['alice'].append({'item_name': 'Eggs', 'expiry_date': '2030-12-01'})
+    cache._refresh('alice')
+    assert cache.generated == [('recipe', ['Bread', 'Milk', 'Eggs', 'Rice'])]
+    assert cache.get('alice', 'recipe', inventory_fingerprint(inventory['alice'])) == {'recipe_name': 'recipe #1'}
+    # The suggestion for the old inventory is gone, replaced by the warmed one
+    assert cache.collection.count_documents({}) == 1
+
+
+def test_subset_suggestions_are_warmed_from_the_same_subset(cache, inventory):
+    subset = inventory['alice'][1::-1]  # The two closest to expiry
+    cache.put('alice', 'recipe', inventory_fingerprint(subset), {'recipe_name': 'old'}, max_ingredients=2)
+    inventory['alice'].append({'item_name': 'Eggs', 'expiry_date': '2030-09-30'})
+    cache._refresh('alice')
+    assert cache.generated == [('recipe', ['Eggs', 'Bread'])]
+    new_subset = [{'item_name': 'Eggs', 'expiry_date': '2030-09-30'}, {'item_name': 'Bread', 'expiry_date': '2030-10-01'}]
+    assert cache.get('alice', 'recipe', inventory_fingerprint(new_subset)) == {'recipe_name': 'recipe #1'}
+
+
+def test_unchanged_subset_is_kept(cache, inventory):
+    subset = inventory['alice'][:2]
+    cache.put('alice', 'recipe', inventory_fingerprint(subset), {'recipe_name': 'kept'}, max_ingredients=2)
+    inventory['alice'].append({'item_name': 'Eggs', 'expiry_date': '2031-12-01'})
+    cache._refresh('alice')
+    assert cache.generated == []
+    assert cache.get('alice', 'recipe', inventory_fingerprint(subset)) == {'recipe_name': 'kept'}
+
+
+def test_warmup_respects_the_budget(cache, inventory):
+    def acquire(username):
+        raise RuntimeError('over budget')
+
+    cache.acquire = acquire
+    cache.put('alice', 'recipe', 'stale', {'recipe_name': 'old'})
+    cache._refresh('alice')
+    assert cache.generated == []
+    assert cache.collection.count_documents({}) == 0
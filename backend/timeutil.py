@@ -0,0 +1,6 @@
+import datetime
+
+
+# pymongo hands back naive UTC datetimes, so everything we store or compare against them uses the same
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,227 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+
+class UpstreamGateway:
+    """Single funnel for every outbound call (BarcodeLookup and the LLM API).
+
+    Calls run as coroutines on one event loop in a background thread, so a
+    Flask thread only blocks on a future instead of holding a socket. Each
+    upstream ("barcodelookup", or an LLM model name) has its own concurrency
+    limit, and identical requests that are already in flight are coalesced
+    into a single upstream call.
+    """
+
+    def __init__(self, llm_client, http_client, limits=None, default_limit=8, timeout=60, metrics=None):
+        self.llm_client = llm_client  # AsyncOpenAI-compatible client
+        self.http_client = http_client  # httpx.AsyncClient
+        self.metrics = metrics  # Optional metrics.Metrics for latency, error and token counters
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.timeout = timeout
+        self._semaphores = {}
+        self._inflight = {}  # request key -> asyncio.Task, only touched on the loop thread
+        self._waiters = {}  # asyncio.Task -> callers still awaiting it, also loop-thread only
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._loop = None
+        self._loop_pid = None
+        self._start_lock = threading.Lock()
+
+    # Public, blocking API for Flask routes
+
+    def chat(self, timeout=None, **completion_args):
+        return self._run(self._chat(completion_args), timeout, span='llm')
+
+    def submit_chat(self, **completion_args):
+        # Non-blocking variant: returns a concurrent.futures.Future, so a caller can race several
+        return asyncio.run_coroutine_threadsafe(self._chat(completion_args), self._ensure_loop())
+
+    def stream_chat(self, timeout=None, **completion_args):
+        # Yields completion chunks; streams are never coalesced but still count against the model's limit
+        model = completion_args.get('model')
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async with self._slot(model):
+                    started = time.perf_counter()
+                    try:
+                        stream = await self.llm_client.chat.completions.create(stream=True, **completion_args)
+                        async for chunk in stream:
+                            self._record_usage(model, chunk)
+                            chunks.put(('chunk', chunk))
+                    except Exception:
+                        self._count_error(model)
+                        raise
+                    finally:
+                        self._observe(model, time.perf_counter() - started)
+            except Exception as e:
+                chunks.put(('error', e))
+            finally:
+                chunks.put(('end', None))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        try:
+            while True:
+                kind, value = chunks.get(timeout=timeout or self.timeout)
+                if kind == 'chunk':
+                    yield value
+                elif kind == 'error':
+                    raise value
+                else:
+                    return
+        finally:
+            # Client went away or we timed out: stop pulling from upstream
+            future.cancel()
+
+    def get(self, url, params=None, limit='http', timeout=None):
+        key = self._request_key('get', {'url': url, 'params': params})
+        return self._run(self._coalesced(key, limit, lambda: self.http_client.get(url, params=params)), timeout, span=limit)
+
+    def stats(self):
+        with self._stats_lock:
+            snapshot = {name: dict(stats) for name, stats in self._stats.items()}
+        for stats in snapshot.values():
+            stats['avg_wait_ms'] = round(stats['wait_ms_total'] / stats['calls'], 2) if stats['calls'] else 0.0
+            stats['wait_ms_total'] = round(stats['wait_ms_total'], 2)
+            stats['wait_ms_max'] = round(stats['wait_ms_max'], 2)
+        return snapshot
+
+    # Event loop plumbing
+
+    def _ensure_loop(self):
+        # Started lazily (and restarted after a fork) so gunicorn workers each get their own loop
+        with self._start_lock:
+            if self._loop is None or self._loop_pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._loop_pid = os.getpid()
+                self._semaphores = {}
+                self._inflight = {}
+                self._waiters = {}
+                threading.Thread(target=self._loop.run_forever, name='upstream-gateway', daemon=True).start()
+            return self._loop
+
+    def _run(self, coro, timeout, span=None):
+        started = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout or self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+        finally:
+            # Wall time as the calling request saw it, queueing included
+            if self.metrics and span:
+                self.metrics.add_span(span, time.perf_counter() - started)
+
+    @staticmethod
+    def _request_key(kind, payload):
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+        return kind + ':' + hashlib.sha1(encoded).hexdigest()
+
+    def _stats_for(self, name):
+        with self._stats_lock:
+            if name not in self._stats:
+                self._stats[name] = {
+                    'limit': self.limits.get(name, self.default_limit),
+                    'in_flight': 0, 'queued': 0, 'max_queued': 0,
+                    'calls': 0, 'coalesced': 0, 'errors': 0,
+                    'wait_ms_total': 0.0, 'wait_ms_max': 0.0
+                }
+            return self._stats[name]
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, name):
+        stats = self._stats_for(name)
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(self.limits.get(name, self.default_limit))
+        semaphore = self._semaphores[name]
+
+        started = time.monotonic()
+        stats['queued'] += 1
+        stats['max_queued'] = max(stats['max_queued'], stats['queued'])
+        try:
+            await semaphore.acquire()
+        finally:
+            stats['queued'] -= 1
+        wait_ms = (time.monotonic() - started) * 1000
+        stats['calls'] += 1
+        stats['wait_ms_total'] += wait_ms
+        stats['wait_ms_max'] = max(stats['wait_ms_max'], wait_ms)
+
+        stats['in_flight'] += 1
+        try:
+            yield
+        except Exception:
+            stats['errors'] += 1
+            raise
+        finally:
+            stats['in_flight'] -= 1
+            semaphore.release()
+
+    def _chat(self, completion_args):
+        key = self._request_key('chat', completion_args)
+        return self._coalesced(key, completion_args.get('model'), lambda: self.llm_client.chat.completions.create(**completion_args))
+
+    async def _limited(self, name, make_call):
+        async with self._slot(name):
+            started = time.perf_counter()
+            try:
+                result = await make_call()
+            except Exception:
+                self._count_error(name)
+                raise
+            finally:
+                self._observe(name, time.perf_counter() - started)
+            self._record_usage(name, result)
+            return result
+
+    # Metrics hooks; all no-ops without a metrics registry
+
+    def _observe(self, name, seconds):
+        if self.metrics:
+            self.metrics.observe('upstream_request_duration_seconds', seconds, upstream=name)
+
+    def _count_error(self, name):
+        if self.metrics:
+            self.metrics.inc('upstream_errors_total', upstream=name)
+
+    def _record_usage(self, name, response):
+        # Completions (and the last chunk of a stream, when the provider sends it) report token usage
+        usage = getattr(response, 'usage', None)
+        if not self.metrics or usage is None:
+            return
+        for kind in ('prompt_tokens', 'completion_tokens'):
+            count = getattr(usage, kind, None)
+            if count:
+                self.metrics.inc('llm_tokens_total', count, model=name, kind=kind.replace('_tokens', ''))
+
+    async def _coalesced(self, key, name, make_call):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._limited(name, make_call))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key) if self._inflight.get(key) is done else None)
+        else:
+            self._stats_for(name)['coalesced'] += 1
+        # Shield so one caller timing out or losing a hedge doesn't cancel the call for everyone sharing it;
+        # once the last caller has gone, cancel it so it stops holding its upstream slot
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
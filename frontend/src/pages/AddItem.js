@@ -132,12 +132,13 @@ const AddItem = () => {
         throw new Error('Unable to capture image');
       }
       const token = localStorage.getItem('access_token');
-      const response = await axios.post(`${API_BASE_URL}/api/extract-info`, {
-        image: imageSrc
-      }, {
+      // Upload the raw image as multipart instead of a base64 JSON string
+      const imageBlob = await (await fetch(imageSrc)).blob();
+      const formData = new FormData();
+      formData.append('image', imageBlob, 'capture.jpg');
+      const response = await axios.post(`${API_BASE_URL}/api/extract-info`, formData, {
         headers: {
-          Authorization: `Bearer ${token}`,
-          'Content-Type': 'application/json'
+          Authorization: `Bearer ${token}`
         }
       });
       console.log('Image extraction data:', response.data);
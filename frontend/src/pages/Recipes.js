@@ -16,6 +16,7 @@ const Recipes = () => {
   const [specialRequests, setSpecialRequests] = useState('');
   const [customCuisineOther, setCustomCuisineOther] = useState('');
   const [chatMessages, setChatMessages] = useState([]);
+  const [conversationId, setConversationId] = useState(null);
   const [userMessage, setUserMessage] = useState('');
   const navigate = useNavigate();
 
@@ -32,7 +33,7 @@ const Recipes = () => {
     fetchRecipe();
   }, []);
 
-  const fetchRecipe = async () => {
+  const fetchRecipe = async (regenerate = false) => {
     setLoading(true);
     setError(null);
     try {
@@ -48,13 +49,15 @@ const Recipes = () => {
 
       // Call LLM API to generate a recipe
       const recipeResponse = await axios.post(`${API_BASE_URL}/api/generate-recipe`, {
-        ingredients
+        ingredients,
+        regenerate // Skip the precomputed suggestion when the user asks for a new one
       }, {
         headers: { Authorization: `Bearer ${token}`, 'Content-Type': 'application/json' }
       });
 
       setRecipe(recipeResponse.data);
       setChatMessages([{ role: 'system', content: 'Ask me anything about the recipe!' }]);
+      setConversationId(null);
     } catch (err) {
       console.error('Error fetching recipe:', err);
       if (err.response && err.response.status === 400) {
@@ -102,6 +105,7 @@ const Recipes = () => {
       });
 
       setRecipe(recipeResponse.data);
+      setConversationId(null);
     } catch (err) {
       console.error('Error fetching custom recipe:', err);
       setError('Error fetching custom recipe. Please try again later.');
@@ -120,9 +124,12 @@ const Recipes = () => {
     const token = localStorage.getItem('access_token');
   
     try {
-      // Send the chat messages along with the recipe data to the backend
-      const response = await axios.post(`${API_BASE_URL}/api/chat-recipe`, {
-        messages: [...chatMessages, newMessage],
+      // The server keeps the history and recipe; only the first message needs to carry the recipe
+      const response = await axios.post(`${API_BASE_URL}/api/chat-recipe`, conversationId ? {
+        conversation_id: conversationId,
+        message: newMessage.content
+      } : {
+        message: newMessage.content,
         recipe_name: recipe.recipe_name,
         description: recipe.description,
         ingredients: recipe.ingredients,
@@ -131,7 +138,8 @@ const Recipes = () => {
         headers: { Authorization: `Bearer ${token}` }
       });
   
-      const assistantMessage = response.data;
+      setConversationId(response.data.conversation_id);
+      const assistantMessage = response.data.message;
       setChatMessages([...chatMessages, newMessage, { role: 'assistant', content: assistantMessage }]);
     } catch (error) {
       console.error('Error during chat:', error);
@@ -203,7 +211,7 @@ const Recipes = () => {
                   </div>
                 )}
                 <div className="text-center mt-5">
-                  <Button variant="primary" onClick={fetchRecipe} className="generate-again-button">
+                  <Button variant="primary" onClick={() => fetchRecipe(true)} className="generate-again-button">
                     <FaRedo className="mr-2" /> Generate New Recipe
                   </Button>
                 </div>
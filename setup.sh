@@ -29,7 +29,7 @@ User=root
 Group=www-data
 WorkingDirectory=/root/Grocify/backend
 Environment="PATH=/root/Grocify/venv/bin"
-ExecStart=/root/Grocify/venv/bin/gunicorn --workers 4 --bind 0.0.0.0:8000 app:app
+ExecStart=/root/Grocify/venv/bin/gunicorn --workers 4 --worker-class gthread --threads 8 --bind 0.0.0.0:8000 app:app
 
 [Install]
 WantedBy=multi-user.target